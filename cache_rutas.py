@@ -0,0 +1,88 @@
+'''
+Caché de resultados de rutas.
+
+LRU acotada con caducidad opcional (TTL). Cada entrada guarda la versión del grafo con la que se calculó
+(ver Grafo.version): si el grafo ha cambiado desde entonces, la entrada se descarta como un fallo, de modo que
+nunca se devuelve una ruta calculada sobre aristas o pesos distintos de los actuales.
+'''
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable
+
+class CacheRutas():
+    '''
+    Caché LRU de rutas con TTL e invalidación por versión del grafo. Es segura entre hilos.
+
+    - capacidad: número máximo de entradas (se expulsa la usada hace más tiempo)
+    - ttl: segundos de vida de cada entrada (None: sin caducidad)
+    - aciertos, fallos: estadísticas de uso (ver estadisticas)
+    '''
+
+    def __init__(self, capacidad: int = 1024, ttl: float = None) -> None:
+
+        self.capacidad = capacidad
+        self.ttl = ttl
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+        self._entradas: OrderedDict = OrderedDict()
+        self._cerrojo = threading.Lock()
+
+    def obtener(self, clave: Hashable, version: int) -> object or None:
+        '''
+        Valor guardado para la clave, o None si no está, ha caducado o se calculó con otra versión del grafo.
+        '''
+
+        with self._cerrojo:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                v, instante, valor = entrada
+                if v == version and (self.ttl is None or time.monotonic() - instante <= self.ttl):
+                    self._entradas.move_to_end(clave)
+                    self.aciertos += 1
+                    return valor
+                del self._entradas[clave]
+            self.fallos += 1
+
+        return None
+
+    def guardar(self, clave: Hashable, version: int, valor: object) -> None:
+        '''
+        Guarda un valor calculado con una versión del grafo, expulsando la entrada menos reciente si está llena.
+        '''
+
+        if self.capacidad <= 0: return
+        with self._cerrojo:
+            self._entradas[clave] = (version, time.monotonic(), valor)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+                self.expulsiones += 1
+
+    def vaciar(self) -> None:
+        '''
+        Elimina todas las entradas (las estadísticas se conservan).
+        '''
+
+        with self._cerrojo:
+            self._entradas.clear()
+
+    def estadisticas(self) -> Dict[str, float]:
+        '''
+        Entradas, aciertos, fallos, expulsiones y tasa de aciertos.
+        '''
+
+        with self._cerrojo:
+            consultas = self.aciertos + self.fallos
+            return {
+                'entradas': len(self._entradas),
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'expulsiones': self.expulsiones,
+                'tasa_aciertos': self.aciertos / consultas if consultas else 0.0,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entradas)
@@ -7,17 +7,21 @@ Script para contrucción del grafo del callejero (de Madrid) a partir de los dat
 '''
 
 import grafo as g
+import importlib.util
+import os
+import time
+import numpy as np
 import pandas as pd
-from support.cons import VELOCIDADES
+from support.cons import VELOCIDADES, COLUMNAS_CRUCES, COLUMNAS_DIRECCIONES
 from support.funcs import _distancia_euclidea_ as distancia
-from typing import Tuple, Dict, List
+from typing import Callable, Iterable, Tuple, Dict, List
 
 class Datos_de_arista():
     '''
     Clase para almacenar os datos de cada arista del callejero en el grafo
     '''
     
-    def __init__(self, codigo: int, v_in: Tuple, v_fin: Tuple, vel_max: float) -> None:
+    def __init__(self, codigo: int, v_in: Tuple, v_fin: Tuple, vel_max: float, longitud: float = None) -> None:
         '''
         Inicialización de los datos.
         
@@ -25,6 +29,7 @@ class Datos_de_arista():
         -> v_in: cruce inicial de la arista
         -> v_fin: cruce final de la vía
         -> vel_max: velocidad máxima permitida en la vía
+        -> longitud: longitud de la arista, si ya se ha calculado (si no, se calcula a partir de v_in y v_fin)
         -------------------------------------------------------------
         - direcciones: direcciones asociadas a la arista (las direcciones de la calle que la involucran)
         - longitud: distancia entre los vértices de la arista definida para el plano del calleero
@@ -34,13 +39,75 @@ class Datos_de_arista():
         self.codigo = codigo
         # self.direcciones = _obtener_direcciones_(codigo, v_in, v_fin)
         self.velocidad_max = vel_max
-        self.longitud = distancia(v_in,v_fin)
+        self.longitud = distancia(v_in,v_fin) if longitud is None else longitud
         self.tiempo = self.longitud/self.velocidad_max
 
+def fuente_dataset(nombre: str) -> str:
+    '''
+    Fichero del que se lee un dataset del callejero: su copia columnar (<nombre>.feather, ver convertir_a_columnar)
+    si existe, es al menos tan reciente como el CSV y está instalado pyarrow para leerla; si no, el CSV.
+
+    -> nombre: nombre del dataset ('cruces' o 'direcciones')
+    '''
+
+    csv, columnar = f'{nombre}.csv', f'{nombre}.feather'
+    if os.path.exists(columnar) and (not os.path.exists(csv) or os.path.getmtime(columnar) >= os.path.getmtime(csv)):
+        if importlib.util.find_spec('pyarrow') is not None: return columnar
+
+    return csv
+
+def _leer_dataset_(nombre: str, columnas: Dict[str, str]) -> pd.DataFrame:
+    '''
+    Lee un dataset del callejero con solo las columnas indicadas y sus tipos compactos (categorías para los
+    textos repetidos, int32 para códigos y coordenadas), del fichero que indica fuente_dataset.
+
+    -> nombre: nombre del dataset ('cruces' o 'direcciones')
+    -> columnas: {columna: tipo}
+    '''
+
+    ruta = fuente_dataset(nombre)
+    if ruta.endswith('.feather'): return pd.read_feather(ruta, columns=list(columnas))
+
+    return pd.read_csv(ruta, sep=';', encoding='latin_1', usecols=list(columnas), dtype=columnas)
+
+def _cargar_cruces_() -> pd.DataFrame:
+
+    return _leer_dataset_('cruces', COLUMNAS_CRUCES)
+
+def _cargar_direcciones_() -> pd.DataFrame:
+
+    return _leer_dataset_('direcciones', COLUMNAS_DIRECCIONES)
+
+def convertir_a_columnar() -> None:
+    '''
+    Convierte una vez los datasets (ya podados y tipados) a Feather, para que los siguientes arranques los lean
+    sin decodificar ni parsear los CSV. Necesita pyarrow.
+    '''
+
+    for nombre, columnas in (('cruces', COLUMNAS_CRUCES), ('direcciones', COLUMNAS_DIRECCIONES)):
+        df = pd.read_csv(f'{nombre}.csv', sep=';', encoding='latin_1', usecols=list(columnas), dtype=columnas)
+        df.to_feather(f'{nombre}.feather')
+
+def _medir_carga_() -> None:
+    '''
+    Compara memoria y tiempo de carga de direcciones.csv completo, podado y tipado, y desde la copia columnar.
+    '''
+
+    def medir(nombre: str, leer: Callable[[], pd.DataFrame]) -> None:
+        s = time.perf_counter()
+        df = leer()
+        e = time.perf_counter()
+        print(f'{nombre}: {e-s:.2f} s, {df.memory_usage(deep=True).sum()/2**20:.1f} MiB')
+
+    medir('CSV completo', lambda: pd.read_csv('direcciones.csv', sep=';', encoding='latin_1', low_memory=False))
+    medir('CSV podado y tipado', lambda: pd.read_csv('direcciones.csv', sep=';', encoding='latin_1', usecols=list(COLUMNAS_DIRECCIONES), dtype=COLUMNAS_DIRECCIONES))
+    if os.path.exists('direcciones.feather'):
+        medir('Feather', lambda: pd.read_feather('direcciones.feather', columns=list(COLUMNAS_DIRECCIONES)))
+
 def _cargar_datos_() -> List[pd.DataFrame]:
 
-    cruces = pd.read_csv('cruces.csv', sep=';', encoding='latin_1')
-    direcciones = pd.read_csv('direcciones.csv', sep=';', encoding='latin_1',low_memory=False)
+    cruces = _cargar_cruces_()
+    direcciones = _cargar_direcciones_()
     
     return [cruces, direcciones]
 
@@ -50,11 +117,10 @@ def _conseguir_tipos_calle_(cruces_df: pd.DataFrame):
     '''
 
     cruces_aux = cruces_df.drop_duplicates(subset=['Codigo de vía tratado'], inplace=False)
-    tipos = {}
-    for calle in cruces_aux.iloc():
-        tipos[calle['Codigo de vía tratado']] = calle['Clase de la via tratado']
     
-    return tipos
+    return dict(zip(cruces_aux['Codigo de vía tratado'], cruces_aux['Clase de la via tratado']))
+
+VEL_DEFECTO = 5000000/3600
 
 def _conseguir_vel_(calle: int, tipos: Dict[int, str]):
     '''
@@ -63,7 +129,85 @@ def _conseguir_vel_(calle: int, tipos: Dict[int, str]):
     try:
         return VELOCIDADES[tipos[calle]]
     except KeyError:
-        return 5000000/3600
+        return VEL_DEFECTO
+
+def _aristas_por_calle_(cruces: pd.DataFrame) -> Tuple[np.ndarray, pd.DataFrame]:
+    '''
+    Versión vectorizada de la unión de cruces por calle de cargar_y_unir_cruces_por_calle (mismos vértices y
+    aristas, sin modificar el DataFrame). Une cada cruce con el anterior cuando ambos son de la misma calle y,
+    como en el grafo no dirigido, de las aristas repetidas entre dos mismos cruces se queda con la primera.
+
+    Devuelve un array (n x 2) con las coordenadas de los cruces en orden de aparición y un DataFrame con una fila
+    por arista: origen y destino (índices de cruce), codigo, velocidad_max, longitud y tiempo.
+    '''
+
+    cruces = cruces.drop_duplicates(subset=['Codigo de vía tratado', 'Coordenada X (Guia Urbana) cm (cruce)','Coordenada Y (Guia Urbana) cm (cruce)'])
+    x = cruces['Coordenada X (Guia Urbana) cm (cruce)'].to_numpy().astype(np.int64)
+    y = cruces['Coordenada Y (Guia Urbana) cm (cruce)'].to_numpy().astype(np.int64)
+    ids, unicos = pd.MultiIndex.from_arrays([x, y]).factorize()
+    coords = np.column_stack((unicos.get_level_values(0), unicos.get_level_values(1))).astype(np.int64)
+
+    #Aristas entre filas consecutivas de la misma calle
+    codigo = cruces['Codigo de vía tratado']
+    mismo = (codigo == codigo.shift()).to_numpy()
+    fin = np.flatnonzero(mismo)
+    aristas = pd.DataFrame({
+        'origen': ids[fin-1],
+        'destino': ids[fin],
+        'codigo': codigo.to_numpy()[fin],
+    })
+    extremos = pd.DataFrame({'a': np.minimum(aristas['origen'], aristas['destino']), 'b': np.maximum(aristas['origen'], aristas['destino'])})
+    aristas = aristas[~extremos.duplicated().to_numpy()].reset_index(drop=True)
+
+    tipos = _conseguir_tipos_calle_(cruces)
+    aristas['velocidad_max'] = aristas['codigo'].map(tipos).map(VELOCIDADES).fillna(VEL_DEFECTO).to_numpy(np.float64)
+    delta = coords[aristas['origen'].to_numpy()] - coords[aristas['destino'].to_numpy()]
+    aristas['longitud'] = np.sqrt((delta.astype(np.float64)**2).sum(axis=1))
+    aristas['tiempo'] = aristas['longitud']/aristas['velocidad_max']
+
+    return coords, aristas
+
+VEL_MAXIMA = max(VELOCIDADES.values())
+
+#Peso de cada arista según el tipo de ruta
+PESOS: Dict[str, Callable[[g.Arista], float]] = {
+    'corta': lambda a: a.data.longitud,
+    'rapida': lambda a: a.data.tiempo,
+}
+
+#Heurísticas admisibles para A* según el tipo de ruta. Los vértices son coordenadas (cm), por lo que la distancia
+#en línea recta nunca supera la longitud de un camino y, dividida por la velocidad máxima, tampoco su tiempo.
+HEURISTICAS: Dict[str, Callable[[Tuple, Tuple], float]] = {
+    'corta': lambda v, destino: distancia(v, destino),
+    'rapida': lambda v, destino: distancia(v, destino)/VEL_MAXIMA,
+    #Los tiempos con tráfico nunca bajan de los tiempos a velocidad máxima (ver trafico.py)
+    'trafico': lambda v, destino: distancia(v, destino)/VEL_MAXIMA,
+}
+
+def _construir_grafo_(coords: np.ndarray, origen: Iterable[int], destino: Iterable[int], codigo: Iterable[int], vel_max: Iterable[float], longitud: Iterable[float]) -> g.Grafo:
+    '''
+    Carga en bloque un grafo del callejero a partir de las coordenadas de sus cruces y de las columnas de sus
+    aristas (índices de cruce de origen y destino, código de calle, velocidad máxima y longitud).
+    '''
+
+    vertices = list(map(tuple, np.asarray(coords).tolist()))
+
+    G = g.Grafo(dirigido=False)
+    G.agregar_vertices_mult(vertices)
+    G.agregar_aristas_mult(
+        (vertices[o], vertices[d], Datos_de_arista(c, vertices[o], vertices[d], vel, lon), 1)
+        for o, d, c, vel, lon in zip(
+            np.asarray(origen).tolist(),
+            np.asarray(destino).tolist(),
+            np.asarray(codigo).tolist(),
+            np.asarray(vel_max).tolist(),
+            np.asarray(longitud).tolist(),
+        )
+    )
+    #Un perfil de pesos por tipo de ruta, para no reescribir los pesos al cambiar de uno a otro
+    for perfil, peso in PESOS.items(): G.agregar_perfil(perfil, peso)
+
+    return G
 
 def cargar_y_unir_cruces_por_calle(cruces: pd.DataFrame) -> g.Grafo:
     '''
@@ -76,26 +220,10 @@ def cargar_y_unir_cruces_por_calle(cruces: pd.DataFrame) -> g.Grafo:
     de los cruces ordenadas por cercanía.
     '''
 
-    cruces.drop_duplicates(subset=['Codigo de vía tratado', 'Coordenada X (Guia Urbana) cm (cruce)','Coordenada Y (Guia Urbana) cm (cruce)'], inplace=True)
-    tipos_calle = _conseguir_tipos_calle_(cruces)
-
-    G = g.Grafo(dirigido=False)
-    code_ant = None
-    cruce_ant = None
-    for cruce in cruces.iloc():
-        codigo = cruce['Codigo de vía tratado']
-        v = (int(cruce['Coordenada X (Guia Urbana) cm (cruce)']), int(cruce['Coordenada Y (Guia Urbana) cm (cruce)']))
-        if not v in G.vertices: G.agregar_vertice(v)
-        if codigo == code_ant:
-            if cruce_ant:
-                G.agregar_arista(
-                    cruce_ant,
-                    v,
-                    Datos_de_arista(codigo, cruce_ant, v, _conseguir_vel_(codigo, tipos_calle)),
-                    1,
-                )
-        code_ant = codigo
-        cruce_ant = v
+    #Las aristas, sus longitudes y sus tiempos se obtienen de una vez con pandas/NumPy (ver _aristas_por_calle_)
+    #y después se cargan en bloque en el grafo, sin recorrer el DataFrame fila a fila
+    coords, aristas = _aristas_por_calle_(cruces)
+    G = _construir_grafo_(coords, aristas['origen'], aristas['destino'], aristas['codigo'], aristas['velocidad_max'], aristas['longitud'])
     
     return G
 
@@ -0,0 +1,370 @@
+'''
+Jerarquías de contracción (Contraction Hierarchies) para el grafo del callejero.
+
+El preprocesado contrae los vértices uno a uno en orden de importancia, añadiendo atajos entre sus vecinos
+cuando el único camino mínimo entre ellos pasaba por el vértice contraído. Las consultas son entonces una
+búsqueda bidireccional que solo sube en la jerarquía, y los atajos se desempaquetan después para recuperar
+la secuencia completa de cruces originales.
+'''
+
+import grafo as g
+import heapq
+import os
+import pickle
+import numpy as np
+from itertools import count
+from snapshot import hash_ficheros, huella_pesos
+from typing import Callable, Dict, List, Tuple
+
+VERSION = 2
+
+class JerarquiaContraccion():
+    '''
+    Jerarquía de contracción de un grafo para un perfil de pesos concreto.
+
+    - rango: posición de cada vértice en el orden de contracción
+    - subida: aristas u -> w con rango[w] > rango[u] (búsqueda hacia delante)
+    - bajada: aristas u -> w con rango[u] > rango[w], guardadas invertidas como bajada[w][u] (búsqueda hacia atrás)
+    - intermedio: vértice contraído que sustituye cada atajo (u, w)
+    - perfil, version: perfil de pesos y versión del grafo para ese perfil (Grafo.version_perfil) con los que
+      se construyó; si el grafo cambia después, la jerarquía deja de ser válida (ver vigente)
+    - huella: hash de los ficheros de origen y de los pesos del perfil (ver snapshot.huella_pesos), para
+      reutilizar la jerarquía guardada en disco solo con el mismo grafo y los mismos pesos
+    '''
+
+    def __init__(self, grafo: g.Grafo, peso: Callable[[g.Arista], float], limite_testigo: int = 60, perfil: str = None) -> None:
+        '''
+        Construye la jerarquía.
+
+        -> grafo: Grafo sobre el que se construye
+        -> peso: función que da el peso de cada Arista en el perfil deseado
+        -> limite_testigo: máximo de vértices asentados en cada búsqueda de caminos testigo
+        -> perfil: perfil del grafo al que corresponde "peso", cuyos cambios invalidan la jerarquía
+        '''
+
+        self.limite_testigo = limite_testigo
+        self.perfil = perfil
+        self.version = grafo.version_perfil(perfil)
+        self.huella = None
+        self.rango: Dict[object, int] = {}
+        self.subida: Dict[object, Dict[object, float]] = {v: {} for v in grafo.vertices}
+        self.bajada: Dict[object, Dict[object, float]] = {v: {} for v in grafo.vertices}
+        self.intermedio: Dict[Tuple[object, object], object] = {}
+
+        #Grafo restante (sin los vértices ya contraídos) con adyacencia de salida y de entrada
+        self._salida: Dict[object, Dict[object, float]] = {v: {} for v in grafo.vertices}
+        self._entrada: Dict[object, Dict[object, float]] = {v: {} for v in grafo.vertices}
+        for v, v_obj in grafo.vertices.items():
+            for w, a in v_obj.adyacencia.items():
+                self._agregar_(v, w, peso(a))
+
+        self._contraer_todo_()
+
+        del self._salida, self._entrada
+
+    #### Preprocesado ####
+    def _agregar_(self, u: object, w: object, peso: float) -> bool:
+        '''
+        Añade la arista u -> w al grafo restante si no existe ya una de menor o igual peso.
+        '''
+
+        if u == w or self._salida[u].get(w, g.INFTY) <= peso: return False
+        self._salida[u][w] = peso
+        self._entrada[w][u] = peso
+
+        return True
+
+    def _testigo_(self, u: object, excluido: object, limite: float, objetivos: set) -> Dict[object, float]:
+        '''
+        Dijkstra acotado desde u en el grafo restante sin pasar por "excluido". Se detiene al superar la
+        distancia "limite", al asentar todos los objetivos o al asentar limite_testigo vértices.
+        '''
+
+        d = {u: 0}
+        visitado = set()
+        orden = count()
+        q = [(0, next(orden), u)]
+        pendientes = len(objetivos)
+
+        while q and len(visitado) < self.limite_testigo:
+            d_v, _, v = heapq.heappop(q)
+            if v in visitado: continue
+            if d_v > limite: break
+            visitado.add(v)
+            if v in objetivos:
+                pendientes -= 1
+                if not pendientes: break
+            for w, peso in self._salida[v].items():
+                if w == excluido: continue
+                d_w = d_v + peso
+                if d_w < d.get(w, g.INFTY):
+                    d[w] = d_w
+                    heapq.heappush(q, (d_w, next(orden), w))
+
+        return d
+
+    def _atajos_(self, v: object) -> List[Tuple[object, object, float]]:
+        '''
+        Atajos (u, w, peso) necesarios para contraer v: uno por cada par de vecinos u -> v -> w
+        sin un camino testigo de igual o menor longitud que evite v.
+        '''
+
+        atajos = []
+        salida = self._salida[v]
+        for u, peso_uv in self._entrada[v].items():
+            objetivos = {w for w in salida if w != u}
+            if not objetivos: continue
+            limite = peso_uv + max(salida[w] for w in objetivos)
+            d = self._testigo_(u, v, limite, objetivos)
+            for w in objetivos:
+                peso_uw = peso_uv + salida[w]
+                if d.get(w, g.INFTY) > peso_uw:
+                    atajos.append((u, w, peso_uw))
+
+        return atajos
+
+    def _prioridad_(self, v: object, contraidos: Dict[object, int]) -> int:
+        '''
+        Importancia de v: diferencia de aristas (atajos creados menos aristas eliminadas) más el número
+        de vecinos ya contraídos, para repartir la contracción uniformemente por el grafo.
+        '''
+
+        eliminadas = len(self._salida[v]) + len(self._entrada[v])
+
+        return len(self._atajos_(v)) - eliminadas + contraidos[v]
+
+    def _contraer_todo_(self) -> None:
+        '''
+        Contrae todos los vértices en orden de prioridad, con actualización perezosa: al extraer un vértice
+        se recalcula su prioridad y, si ha empeorado respecto al siguiente de la cola, se vuelve a encolar.
+        '''
+
+        contraidos = {v: 0 for v in self._salida}
+        orden = count()
+        q = [(self._prioridad_(v, contraidos), next(orden), v) for v in self._salida]
+        heapq.heapify(q)
+
+        while q:
+            _, _, v = heapq.heappop(q)
+            prioridad = self._prioridad_(v, contraidos)
+            if q and prioridad > q[0][0]:
+                heapq.heappush(q, (prioridad, next(orden), v))
+                continue
+
+            for u, w, peso in self._atajos_(v):
+                if self._agregar_(u, w, peso): self.intermedio[(u, w)] = v
+
+            #Las aristas que quedan de v van a vértices de mayor rango
+            self.rango[v] = len(self.rango)
+            for w, peso in self._salida.pop(v).items():
+                self.subida[v][w] = peso
+                del self._entrada[w][v]
+                contraidos[w] += 1
+            for u, peso in self._entrada.pop(v).items():
+                self.bajada[v][u] = peso
+                del self._salida[u][v]
+                contraidos[u] += 1
+
+    #### Consultas ####
+    def vigente(self, grafo: g.Grafo) -> bool:
+        '''
+        Indica si la jerarquía corresponde todavía al grafo: una arista eliminada o añadida, o un peso del perfil
+        cambiado, después de construirla dejaría atajos que ya no existen o que no son mínimos.
+        '''
+
+        return self.version == grafo.version_perfil(self.perfil)
+
+    def consulta(self, origenes: Dict[object, float], destinos: Dict[object, float]) -> List[object]:
+        '''
+        Búsqueda bidireccional ascendente entre un conjunto de vértices de origen y otro de destino, cada uno
+        con un coste inicial (permite partir de vértices que no están en la jerarquía, como direcciones unidas
+        a sus cruces). Devuelve el camino desempaquetado entre el mejor par origen-destino, o [] si no hay.
+        '''
+
+        adyacencias = (self.subida, self.bajada)
+        d = (dict(origenes), dict(destinos))
+        padre = ({v: None for v in origenes}, {v: None for v in destinos})
+        visitado = (set(), set())
+        orden = count()
+        q = ([(c, next(orden), v) for v, c in origenes.items()], [(c, next(orden), v) for v, c in destinos.items()])
+        for cola in q: heapq.heapify(cola)
+
+        mu = g.INFTY
+        encuentro = None
+        for v in origenes:
+            if v in destinos and origenes[v] + destinos[v] < mu:
+                mu = origenes[v] + destinos[v]
+                encuentro = v
+
+        #En una jerarquía las búsquedas no se pueden cortar al cruzarse: cada una sigue hasta superar mu
+        while (q[0] and q[0][0][0] < mu) or (q[1] and q[1][0][0] < mu):
+            i = 0 if q[0] and (not q[1] or q[0][0][0] <= q[1][0][0]) else 1
+            d_v, _, v = heapq.heappop(q[i])
+            if v in visitado[i]: continue
+            visitado[i].add(v)
+            if v in d[1-i] and d_v + d[1-i][v] < mu:
+                mu = d_v + d[1-i][v]
+                encuentro = v
+            for w, peso in adyacencias[i][v].items():
+                d_w = d_v + peso
+                if d_w < d[i].get(w, g.INFTY):
+                    d[i][w] = d_w
+                    padre[i][w] = v
+                    heapq.heappush(q[i], (d_w, next(orden), w))
+
+        if encuentro is None: return []
+
+        subida = []
+        aux = encuentro
+        while aux is not None:
+            subida.append(aux)
+            aux = padre[0][aux]
+        subida.reverse()
+        aux = padre[1][encuentro]
+        while aux is not None:
+            subida.append(aux)
+            aux = padre[1][aux]
+
+        return self._desempaquetar_(subida)
+
+    def camino_minimo(self, origen: object, destino: object) -> List[object]:
+        '''
+        Camino mínimo entre dos vértices de la jerarquía (solo [origen] si el destino no es alcanzable,
+        igual que Grafo.camino_minimo).
+        '''
+
+        return self.consulta({origen: 0}, {destino: 0}) or [origen]
+
+    def _desempaquetar_(self, camino: List[object]) -> List[object]:
+        '''
+        Sustituye cada atajo del camino por los vértices que representa, hasta llegar a aristas originales.
+        '''
+
+        if not camino: return []
+
+        resultado = [camino[0]]
+        for i in range(len(camino)-1):
+            pila = [(camino[i], camino[i+1])]
+            while pila:
+                u, w = pila.pop()
+                v = self.intermedio.get((u, w))
+                if v is None:
+                    resultado.append(w)
+                else:
+                    pila.append((v, w))
+                    pila.append((u, v))
+
+        return resultado
+
+    def _espacio_(self, semillas: Dict[object, float], adyacencia: Dict[object, Dict[object, float]]) -> Dict[object, float]:
+        '''
+        Búsqueda ascendente completa desde unas semillas: distancia a cada vértice de su espacio de búsqueda en la
+        jerarquía (hacia delante con subida, hacia atrás con bajada).
+        '''
+
+        d = dict(semillas)
+        visitado = set()
+        orden = count()
+        q = [(c, next(orden), v) for v, c in semillas.items()]
+        heapq.heapify(q)
+        while q:
+            d_v, _, v = heapq.heappop(q)
+            if v in visitado: continue
+            visitado.add(v)
+            for w, peso in adyacencia[v].items():
+                d_w = d_v + peso
+                if d_w < d.get(w, g.INFTY):
+                    d[w] = d_w
+                    heapq.heappush(q, (d_w, next(orden), w))
+
+        return d
+
+    def matriz(self, origenes: List[Dict[object, float]], destinos: List[Dict[object, float]], bloque: int = 1024) -> np.ndarray:
+        '''
+        Matriz de distancias muchos a muchos con cubos: la búsqueda hacia atrás de cada destino deja en cada vértice
+        de su espacio de búsqueda un cubo (destino, distancia), y la búsqueda hacia delante de cada origen solo
+        tiene que recorrer los cubos de los vértices que alcanza. Los destinos se procesan en bloques para acotar
+        la memoria de los cubos. Devuelve np.inf para los pares sin camino.
+
+        -> origenes: semillas {vértice: coste} de cada origen (filas), como en consulta
+        -> destinos: semillas {vértice: coste} de cada destino (columnas)
+        -> bloque: número de destinos cuyos cubos se guardan a la vez
+        '''
+
+        matriz = np.full((len(origenes), len(destinos)), np.inf)
+        espacios = [self._espacio_(semillas, self.subida) for semillas in origenes]
+
+        for inicio in range(0, len(destinos), bloque):
+            fin = min(inicio + bloque, len(destinos))
+            cubos: Dict[object, List[Tuple[int, float]]] = {}
+            for j, semillas in enumerate(destinos[inicio:fin]):
+                for v, c in self._espacio_(semillas, self.bajada).items():
+                    cubos.setdefault(v, []).append((j, c))
+            for i, espacio in enumerate(espacios):
+                fila = [g.INFTY] * (fin - inicio)
+                for v, c in espacio.items():
+                    for j, c_j in cubos.get(v, ()):
+                        if c + c_j < fila[j]: fila[j] = c + c_j
+                matriz[i, inicio:fin] = fila
+
+        matriz[matriz >= g.INFTY] = np.inf
+
+        return matriz
+
+    #### Persistencia ####
+    def guardar(self, ruta: str) -> None:
+        '''
+        Guarda la jerarquía en disco.
+        '''
+
+        with open(ruta, 'wb') as fichero:
+            pickle.dump((VERSION, self.__dict__), fichero, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def cargar(cls, ruta: str) -> 'JerarquiaContraccion':
+        '''
+        Carga una jerarquía guardada con guardar. Lanza ValueError si fue guardada con otra versión del formato.
+        '''
+
+        with open(ruta, 'rb') as fichero:
+            version, datos = pickle.load(fichero)
+        if version != VERSION:
+            raise ValueError(f'Versión de jerarquía incompatible: {version}')
+
+        jerarquia = cls.__new__(cls)
+        jerarquia.__dict__.update(datos)
+
+        return jerarquia
+
+def cargar_o_construir_jerarquias(grafo: g.Grafo, pesos: Dict[str, Callable[[g.Arista], float]], directorio: str = '.', fuentes: List[str] = None) -> Dict[str, JerarquiaContraccion]:
+    '''
+    Obtiene una jerarquía por cada perfil de pesos. Las carga de disco ("jerarquia_<perfil>.pkl") si existen
+    y se construyeron a partir de los mismos ficheros de origen y con los mismos pesos; si no, las construye
+    y las guarda.
+
+    -> grafo: Grafo del callejero
+    -> pesos: función de peso de cada perfil ('corta', 'rapida', ...)
+    -> directorio: carpeta donde se guardan las jerarquías
+    -> fuentes: ficheros de los que se ha construido el grafo (ver snapshot.hash_ficheros)
+    '''
+
+    jerarquias = {}
+    hash_fuentes = hash_ficheros(fuentes) if fuentes else ''
+    for perfil, peso in pesos.items():
+        ruta = os.path.join(directorio, f'jerarquia_{perfil}.pkl')
+        huella = huella_pesos(grafo, peso, hash_fuentes)
+        jerarquia = None
+        if os.path.exists(ruta):
+            try:
+                jerarquia = JerarquiaContraccion.cargar(ruta)
+            except (ValueError, pickle.UnpicklingError, EOFError):
+                jerarquia = None
+        if jerarquia is None or jerarquia.huella != huella:
+            jerarquia = JerarquiaContraccion(grafo, peso, perfil=perfil)
+            jerarquia.huella = huella
+            jerarquia.guardar(ruta)
+        #La versión guardada es la del grafo de otra ejecución: la jerarquía cargada corresponde al grafo actual
+        jerarquia.perfil, jerarquia.version = perfil, grafo.version_perfil(perfil)
+        jerarquias[perfil] = jerarquia
+
+    return jerarquias
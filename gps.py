@@ -2,35 +2,57 @@
 GPS
 '''
 
-from construccion_grafo import _cargar_datos_, cargar_y_unir_cruces_por_calle, Datos_de_arista
+from construccion_grafo import _cargar_cruces_, _cargar_direcciones_, cargar_y_unir_cruces_por_calle, fuente_dataset, Datos_de_arista, HEURISTICAS
+from contraccion import JerarquiaContraccion, cargar_o_construir_jerarquias
+from landmarks import Landmarks, cargar_o_construir_landmarks
+from snapshot import cargar_snapshot, guardar_snapshot
+from indices import IndiceDirecciones, IndiceCalles, IndiceEspacial, nombres_calles
+from cache_rutas import CacheRutas
+from mapa import MapaBase
 import grafo as g
 import support.funcs as f
 from support.cons import ALPHA, BOLD, END, CLASES_VIA, UNDERLINE
+import numpy as np
 import pandas as pd
 import time
-import networkx as nx
-import matplotlib.pyplot as plt
-from typing import Tuple, Dict, List
+from typing import BinaryIO, Tuple, Dict, List
 
 class Navegador():
 
-    def __init__(self, grafo: g.Grafo, direcciones: pd.DataFrame, codigos_validos: List[int]) -> None:
+    def __init__(self, grafo: g.Grafo, direcciones: pd.DataFrame, codigos_validos: set, jerarquias: Dict[str, JerarquiaContraccion] = None, landmarks: Landmarks = None, calles: IndiceCalles = None, espacial: IndiceEspacial = None, cache: CacheRutas = None) -> None:
         '''
         Inicilización del navegador.
 
         -> grafo: Grafo del callejero
         -> direcciones: DataFrame con direcciones
-        -> tipo_ruta: 'corta' o 'rapida'
+        -> codigos_validos: códigos de las calles con cruces en el grafo
+        -> jerarquias: jerarquías de contracción por tipo de ruta (opcional)
+        -> landmarks: tablas de landmarks para A* con ALT (opcional)
+        -> calles: índice de los cruces de cada calle (si no se pasa, se construye a partir del grafo)
+        -> espacial: índice espacial de cruces y aristas (si no se pasa, se construye a partir del grafo)
+        -> cache: caché de rutas de calcular_ruta (por defecto, una CacheRutas de 1024 rutas sin caducidad)
         '''
         
         self.grafo = grafo
         self.direcciones = direcciones
         self.codigos_validos = codigos_validos
+        self.jerarquias = jerarquias if jerarquias else {}
+        self.landmarks = landmarks
         self.tipo_ruta = None
+
+        #Índice de direcciones para no filtrar el DataFrame en cada búsqueda
+        self.indice_direcciones = IndiceDirecciones(direcciones)
+        #Nombre de cada calle para las instrucciones
+        self.nombres_calles = nombres_calles(direcciones)
+        #Índice de cruces por calle, para situar las direcciones sin recorrer todas las aristas
+        self.calles = calles if calles else IndiceCalles.desde_grafo(grafo)
+        #Índice espacial, para situar direcciones de calles sin cruces y coordenadas cualesquiera
+        self.espacial = espacial if espacial else IndiceEspacial.desde_grafo(grafo)
+        #Rutas ya calculadas, invalidadas automáticamente si cambia la versión del grafo
+        self.cache = cache if cache is not None else CacheRutas()
         
-        #Datos del navegador para mayor rendimiento con NetworkX
-        self.xgrafo: nx.Graph = None
-        self.pos: Dict[Tuple] = {v: v for v in grafo.vertices}
+        #Capa fija del mapa (red de calles), que se prepara la primera vez que se dibuja una ruta
+        self.mapa: MapaBase = None
 
     def _seleccionar_direccion_(self, tipo: str) -> List[int or Tuple]:
         '''
@@ -75,47 +97,40 @@ class Navegador():
             clase, nombre, numero = ins
 
             if not clase and not nombre and not numero: return []
-            
-            d = self.direcciones.loc[self.direcciones['Clase de la via'] == clase + (24-len(clase))*' ']
-            
-            d = d.loc[d['Nombre de la vía'] == nombre+(48-len(nombre))*' ']
 
-            direccion = []
-            
-            for c in d.iloc():
-                if int(c['Direccion completa para el numero'].split(',')[1].split(' ')[1]) == numero:
-                    direccion.append(c)
+            letras = self.indice_direcciones.opciones(clase, nombre, numero)
 
-            if len(direccion) > 1:
+            if len(letras) > 1:
                 txt = '| '
-                for d in direccion:
-                    l = d['Direccion completa para el numero'].split(',')[1].split(' ')[2]
-                    if l == '':
-                        l = d['Direccion completa para el numero'].split(',')[1].split(' ')[3]
+                for l in letras:
                     txt += BOLD + l + END + ' | ' 
                 print(txt)
                 letra = input('· Selecione una letra: ').strip()
-                for d in direccion:
-                    l = d['Direccion completa para el numero'].split(',')[1].split(' ')[2]
-                    if l == '':
-                        l = d['Direccion completa para el numero'].split(',')[1].split(' ')[3]
-                    if letra == l:
-                        direccion = [d['Codigo de via'],(int(d['Coordenada X (Guia Urbana) cm']),int(d['Coordenada Y (Guia Urbana) cm']))]
-            elif len(direccion) == 1:
-                d = direccion[0]
-                direccion = [d['Codigo de via'],(int(d['Coordenada X (Guia Urbana) cm']),int(d['Coordenada Y (Guia Urbana) cm']))]
+                direccion = self.buscar_direccion(clase, nombre, numero, letra)
+                if not direccion: f._pop_error_('Dirección inexistente')
+            elif len(letras) == 1:
+                direccion = self.buscar_direccion(clase, nombre, numero)
             else:
                 f._pop_error_('Dirección inexistente')
                 direccion = []
 
-            if direccion and not d['Codigo de via'] in self.codigos_validos:
-                direccion = []
-                f._pop_error_('No existen cruces para esta direccion')
-
             
 
         return direccion
 
+    def buscar_direccion(self, clase: str, nombre: str, numero: int, letra: str = None) -> List[int or Tuple]:
+        '''
+        Búsqueda no interactiva de una dirección. Devuelve el código de la vía y una tupla con las coordenadas
+        exactas de la dirección, o [] si no existe (o si el número tiene varias letras y no se indica cuál).
+
+        -> clase: clase de la vía
+        -> nombre: nombre de la vía (sin partícula)
+        -> numero: número de la dirección
+        -> letra: letra de la dirección (opcional)
+        '''
+
+        return self.indice_direcciones.buscar(clase, nombre, numero, letra)
+
     def _seleccionar_tipo_ruta_(self) -> str:
 
         r = None
@@ -130,74 +145,311 @@ class Navegador():
     
     def cambiar_ruta(self, ruta):
         '''
-        Cambia el tipo de ruta que busca el navegador.
+        Cambia el tipo de ruta que busca el navegador. Cada arista guarda su peso en todos los perfiles
+        (ver Grafo.agregar_perfil), así que solo cambia el perfil con el que se consulta.
 
-        -> ruta: 'corta' o 'rapida'
+        -> ruta: 'corta', 'rapida' o cualquier otro perfil del grafo
         '''
 
-        if ruta != self.tipo_ruta:
+        if ruta not in self.grafo.perfiles: raise ValueError(f'Tipo de ruta desconocido: {ruta}')
 
-            self.tipo_ruta = ruta
-            
-            for arista in self.grafo.aristas:
-                
-                if ruta == 'corta':
-                    arista.weight = arista.data.longitud
-                
-                elif ruta == 'rapida':
-                    arista.weight = arista.data.tiempo
-
-    def _añadir_direccion_grafo_(self, codigo: int, coord: Tuple[int]) -> None:
-        '''
-        Añade al grafo del navegador un vértice representando la direccion, dadas sus coordenadas y su código de calle.
-        Lo conecta con los cruces más cercanos.
-        '''
-
-        if not coord in self.grafo.vertices.keys():
-            #Buscar los dos cruces, de la calle en la que esta la direccion, que contienen a la dirección
-            vertices_calle = []
-            for arista in self.grafo.aristas:
-                if arista.data.codigo == codigo:
-                    if not arista.origen in vertices_calle: vertices_calle.append(arista.origen)
-                    if not arista.destino in vertices_calle: vertices_calle.append(arista.destino)
-            dists = [f._distancia_euclidea_(coord, v) for v in vertices_calle]
-
-            i = dists.index(min(dists))
-            v1_coord = vertices_calle.pop(i)
-            j = dists.index(min(dists))
-            v2_coord = vertices_calle.pop(j)
+        self.tipo_ruta = ruta
+
+    def _semillas_(self, v: Tuple[int], indice: Dict[Tuple, object], perfil: str, virtuales: Dict = None) -> Dict[Tuple, float]:
+        '''
+        Vértices desde los que se entra en una estructura precalculada (jerarquía o landmarks) para llegar a v
+        o salir de él: el propio v si está en ella o, si es un vértice virtual de la consulta, sus cruces
+        vecinos con el peso (en el perfil dado) de la arista que los une.
+        '''
+
+        if v in indice: return {v: 0}
+        adyacencia = self.grafo.vertices[v].adyacencia if v in self.grafo.vertices else (virtuales or {}).get(v, {})
+
+        return {w: a.pesos[perfil] for w, a in adyacencia.items() if w in indice}
+
+    def _jerarquia_(self, perfil: str) -> JerarquiaContraccion or None:
+        '''
+        Jerarquía de contracción del perfil, o None si no la hay o si el grafo ha cambiado desde que se construyó
+        (aristas o pesos del perfil), en cuyo caso las consultas vuelven a A* sobre el grafo actual.
+        '''
+
+        jerarquia = self.jerarquias.get(perfil)
+
+        return jerarquia if jerarquia and jerarquia.vigente(self.grafo) else None
+
+    def camino_minimo(self, origen: Tuple[int], destino: Tuple[int], perfil: str = None, virtuales: Dict = None) -> List[Tuple]:
+        '''
+        Calcula la ruta entre dos vértices del grafo según el tipo de ruta indicado (por defecto, el actual). Si hay
+        una jerarquía de contracción vigente para ese tipo de ruta se usa; si no, A* con la heurística de coordenadas,
+        reforzada con las cotas de los landmarks si los hay. El grafo no se modifica, así que consultas con
+        distintos tipos de ruta pueden compartirlo.
+
+        -> virtuales: vértices virtuales de la consulta (ver conectar_direcciones)
+        '''
+
+        perfil = perfil if perfil else self.tipo_ruta
+        heuristica = HEURISTICAS.get(perfil, lambda v, t: 0)
+
+        jerarquia = self._jerarquia_(perfil)
+        if jerarquia:
+            camino = jerarquia.consulta(self._semillas_(origen, jerarquia.rango, perfil, virtuales), self._semillas_(destino, jerarquia.rango, perfil, virtuales))
+            if not camino: return [origen]
+            if camino[0] != origen: camino.insert(0, origen)
+            if camino[-1] != destino: camino.append(destino)
+            return camino
+
+        if self.landmarks and perfil in self.landmarks.desde:
+            alt = self.landmarks.heuristica(perfil, self._semillas_(destino, self.landmarks.indice, perfil, virtuales))
+            coordenadas = heuristica
+            heuristica = lambda v, t: max(alt(v, t), coordenadas(v, t))
+
+        return self.grafo.camino_minimo(origen, destino, metodo='a_estrella', heuristica=heuristica, perfil=perfil, virtuales=virtuales)
+
+    def matriz_distancias(self, origenes: List[Tuple[int, Tuple[int]]], destinos: List[Tuple[int, Tuple[int]]], perfil: str = None) -> np.ndarray:
+        '''
+        Matriz (len(origenes) x len(destinos)) de costes de las rutas entre direcciones según el tipo de ruta
+        indicado (por defecto, el actual): metros*100 para 'corta' y segundos para 'rapida' (np.inf si no hay
+        ruta). Con jerarquía de contracción se usa su algoritmo muchos a muchos por cubos; si no, una búsqueda
+        por origen (Grafo.matriz_distancias). Las direcciones se conectan con vértices virtuales, sin modificar
+        el grafo.
+
+        -> origenes: direcciones [codigo de via, (x, y)] de origen (codigo None para puntos cualesquiera)
+        -> destinos: direcciones [codigo de via, (x, y)] de destino
+        -> perfil: tipo de ruta
+        '''
+
+        perfil = perfil if perfil else self.tipo_ruta
+        virtuales = self.conectar_direcciones(list(origenes) + list(destinos))
+        coords_o, coords_d = [o[1] for o in origenes], [t[1] for t in destinos]
+
+        jerarquia = self._jerarquia_(perfil)
+        if not jerarquia:
+            return self.grafo.matriz_distancias(coords_o, coords_d, perfil, virtuales)
+
+        matriz = jerarquia.matriz(
+            [self._semillas_(v, jerarquia.rango, perfil, virtuales) for v in coords_o],
+            [self._semillas_(v, jerarquia.rango, perfil, virtuales) for v in coords_d],
+        )
+        #Una dirección virtual consigo misma (las semillas no lo ven: salen y vuelven por sus cruces)
+        columnas = {}
+        for j, v in enumerate(coords_d): columnas.setdefault(v, []).append(j)
+        for i, v in enumerate(coords_o): matriz[i, columnas.get(v, [])] = 0
+
+        return matriz
+
+    def isocrona(self, origen: List, limite: float, perfil: str = None, envolvente: bool = False, celda: float = None) -> Dict[str, np.ndarray]:
+        '''
+        Área de servicio de una dirección: cruces alcanzables desde ella con un coste menor o igual que "limite",
+        en las unidades del tipo de ruta (metros*100 para 'corta', segundos para 'rapida'). Usa la búsqueda
+        acotada Grafo.isocrona, que se detiene en el límite, con la dirección como vértice virtual. Devuelve un
+        diccionario con:
+
+        - vertices: array (n x 2) con las coordenadas de los cruces alcanzados, por coste creciente
+        - costes: array (n) con el coste de llegar a cada uno
+        - envolvente: si se pide, array (k x 2) con el polígono convexo que los contiene
+        - raster, origen_raster, celda: si se indica celda, rejilla (columnas x filas) con el coste mínimo de los
+        cruces de cada celda (np.inf en las no alcanzadas) y la esquina inferior izquierda de la celda [0, 0]
+
+        -> origen: dirección [codigo de via, (x, y)] (codigo None para coordenadas cualesquiera)
+        -> limite: coste máximo
+        -> perfil: tipo de ruta; por defecto, el actual
+        -> envolvente: si se calcula la envolvente convexa
+        -> celda: lado de las celdas de la rejilla, en cm (sin rejilla si no se indica)
+        '''
+
+        perfil = perfil if perfil else self.tipo_ruta
+        if perfil not in self.grafo.perfiles: raise ValueError(f'Tipo de ruta desconocido: {perfil}')
+        origen = [origen[0], tuple(origen[1])]
+
+        virtuales = self.conectar_direcciones([origen])
+        alcanzados, costes = self.grafo.isocrona(origen[1], limite, perfil, virtuales)
+        #Solo cruces del grafo (la dirección de origen, si es virtual, no lo es)
+        reales = np.fromiter((v in self.grafo.vertices for v in alcanzados), dtype=bool, count=len(alcanzados))
+        vertices = np.array([v for v, real in zip(alcanzados, reales) if real], dtype=np.int64).reshape(-1, 2)
+        resultado = {'vertices': vertices, 'costes': costes[reales]}
+
+        if envolvente:
+            resultado['envolvente'] = np.array(f._envolvente_convexa_(vertices.tolist()), dtype=np.int64).reshape(-1, 2)
+
+        if celda:
+            minimo = vertices.min(axis=0) if len(vertices) else np.zeros(2, dtype=np.int64)
+            c = (vertices - minimo) // celda
+            c = c.astype(np.int64)
+            raster = np.full(tuple(c.max(axis=0) + 1) if len(c) else (0, 0), np.inf)
+            np.minimum.at(raster, (c[:, 0], c[:, 1]), resultado['costes'])
+            resultado.update({'raster': raster, 'origen_raster': minimo, 'celda': celda})
+
+        return resultado
+
+    def calcular_ruta(self, origen: List, destino: List, perfil: str = None) -> Dict or None:
+        '''
+        Cálculo de una ruta sin interacción con el usuario ni cambios en el navegador, apto para atender
+        varias consultas a la vez. Devuelve un diccionario con el camino (lista de coordenadas), su longitud
+        en metros, su tiempo en segundos a velocidad máxima, su coste en el perfil (por ejemplo, el tiempo con
+        tráfico) y las instrucciones (también como texto, el de get_instrucciones), o None si no hay ruta. Los
+        resultados se guardan en la caché del navegador por (origen, destino, perfil), con los puntos cualesquiera
+        ya situados sobre su tramo de calle (ver _situar_), y se reutilizan mientras no cambie la versión del
+        grafo para ese perfil; el diccionario devuelto no debe modificarse.
+
+        -> origen, destino: direcciones [codigo de via, (x, y)] (ver buscar_direccion); con codigo None
+        se toman como coordenadas cualesquiera y la ruta empieza o acaba en su proyección sobre el tramo de
+        calle más cercano (ver _situar_)
+        -> perfil: tipo de ruta ('corta', 'rapida', ...); por defecto, el actual
+        '''
+
+        perfil = perfil if perfil else self.tipo_ruta
+        if perfil not in self.grafo.perfiles: raise ValueError(f'Tipo de ruta desconocido: {perfil}')
+        (origen, clave_origen), (destino, clave_destino) = self._situar_(origen), self._situar_(destino)
+
+        clave = (clave_origen, clave_destino, perfil)
+        version = self.grafo.version_perfil(perfil)
+        ruta = self.cache.obtener(clave, version)
+        if ruta is not None: return ruta or None
+
+        virtuales = self.conectar_direcciones([origen, destino])
+        camino = self.camino_minimo(origen[1], destino[1], perfil, virtuales)
+        if camino[-1] != destino[1]:
+            #También se guarda que no hay ruta (como diccionario vacío)
+            self.cache.guardar(clave, version, {})
+            return None
+
+        ruta = self._resultado_ruta_(camino, perfil, virtuales)
+        self.cache.guardar(clave, version, ruta)
+
+        return ruta
+
+    def _situar_(self, direccion: List) -> Tuple[List, Tuple]:
+        '''
+        Dirección [codigo de via, (x, y)] con la que se calcula una ruta y su clave en la caché de rutas. Las
+        coordenadas cualesquiera (codigo None o de una calle sin cruces en el grafo) se sustituyen por su
+        proyección, en cm enteros, sobre el tramo de calle más cercano, y su clave es el tramo y el punto
+        proyectado: así todos los puntos que caen en el mismo punto de la calle comparten la ruta guardada, y
+        esta es la misma que se calcularía para cualquiera de ellos.
+        '''
+
+        codigo, coord = direccion[0], tuple(direccion[1])
+        if codigo in self.codigos_validos or coord in self.grafo.vertices: return [codigo, coord], (codigo, coord)
+
+        situado = self.snap(coord)
+        if situado is None: return [codigo, coord], (codigo, coord)
+        v1, v2, proyeccion, _ = situado
+        coord = tuple(int(round(c)) for c in proyeccion)
+
+        return [codigo, coord], (v1, v2, coord)
+
+    def _resultado_ruta_(self, camino: List[Tuple], perfil: str, virtuales: Dict = None) -> Dict:
+        '''
+        Diccionario de resultado de una ruta (ver calcular_ruta).
+        '''
+
+        aristas = self._aristas_camino_(camino, virtuales)
+        giros = self._giros_(aristas)
+
+        return {
+            'perfil': perfil,
+            'camino': [list(v) for v in camino],
+            'longitud': sum(a.data.longitud for a in aristas)/100,
+            'tiempo': sum(a.data.tiempo for a in aristas),
+            'coste': sum(a.pesos[perfil] for a in aristas),
+            'instrucciones': [{'metros': m, 'calle': c, 'giro': d} for m, c, d in zip(giros['longitud'], giros['calle'], giros['direccion'])],
+            'texto': self._texto_instrucciones_(giros),
+        }
+
+    def calcular_alternativas(self, origen: List, destino: List, k: int = 3, perfil: str = None, max_similitud: float = 0.8) -> List[Dict]:
+        '''
+        Hasta k rutas distintas entre dos direcciones, de mejor a peor según el tipo de ruta, cada una con el
+        formato de calcular_ruta (lista vacía si no hay ruta). Usa Grafo.caminos_alternativos con las direcciones
+        como vértices virtuales, sin modificar el grafo.
+
+        -> origen, destino: direcciones [codigo de via, (x, y)] (codigo None para coordenadas cualesquiera)
+        -> k: número máximo de rutas
+        -> perfil: tipo de ruta; por defecto, el actual
+        -> max_similitud: fracción máxima de cada ruta (en coste) que puede coincidir con una ruta anterior
+        '''
+
+        perfil = perfil if perfil else self.tipo_ruta
+        if perfil not in self.grafo.perfiles: raise ValueError(f'Tipo de ruta desconocido: {perfil}')
+        origen, destino = [origen[0], tuple(origen[1])], [destino[0], tuple(destino[1])]
+
+        virtuales = self.conectar_direcciones([origen, destino])
+        caminos = self.grafo.caminos_alternativos(origen[1], destino[1], k, perfil, virtuales, max_similitud)
+
+        return [self._resultado_ruta_(camino, perfil, virtuales) for camino, _ in caminos]
+
+    def _conectar_direccion_(self, codigo: int, coord: Tuple[int]) -> List[Tuple]:
+        '''
+        Aristas que conectan un vértice representando la direccion, dadas sus coordenadas y su código de calle, con
+        los cruces más cercanos, como tuplas (origen, destino, data, weight) que no se añaden al grafo. Si la calle
+        no tiene cruces en el grafo (o no se indica), lo conecta con los cruces del tramo de calle más cercano
+        (ver snap). Si la dirección ya es un vértice del grafo no hace falta ninguna arista. Lanza ValueError si no
+        hay ningún tramo de calle con el que conectarla (grafo sin aristas).
+        '''
+
+        if coord in self.grafo.vertices: return []
+
+        if not codigo in self.codigos_validos:
+            situado = self.snap(coord)
+            if situado is None: raise ValueError(f'No hay ninguna calle con la que conectar la dirección {coord}')
+            v1_coord, v2_coord, _, _ = situado
+            a = self.grafo.vertices[v1_coord].adyacencia[v2_coord]
+            codigo, vel = a.data.codigo, a.data.velocidad_max
+        else:
+            #Los dos cruces de la calle de la dirección más cercanos a ella
+            v1_coord, v2_coord = self.calles.mas_cercanos(codigo, coord, 2)
 
             v1 = self.grafo.vertices[v1_coord]
-            v2 = self.grafo.vertices[v2_coord]
-            #Conectar los vértices más cercanos a la dirección
+            #Conectar los vértices más cercanos a la dirección: si no son consecutivos en la calle,
+            #se toma el vecino de v1 en la misma calle más cercano a la dirección
             if not v2_coord in v1.adyacencia:
-                for v in v1.adyacencia:
-                    vs = []
-                    if v1.adyacencia[v].data.codigo == codigo:
-                        vs.append(v)
+                vs = [v for v in v1.adyacencia if v1.adyacencia[v].data.codigo == codigo]
                 vs_dists = [f._distancia_euclidea_(coord, w) for w in vs]
-                v2_coord = vs[vs_dists.index(min(vs))]
+                v2_coord = vs[vs_dists.index(min(vs_dists))]
             
             vel = v1.adyacencia[v2_coord].data.velocidad_max
 
-            self.grafo.agregar_vertice(coord)
-            self.grafo.agregar_aristas_mult(
-                [(coord, v1_coord, Datos_de_arista(codigo, coord, v1_coord, vel), 1),
-                (coord, v2_coord, Datos_de_arista(codigo, coord, v1_coord, vel), 1)]
-                )
+        return [(coord, v1_coord, Datos_de_arista(codigo, coord, v1_coord, vel), 1),
+                (coord, v2_coord, Datos_de_arista(codigo, coord, v2_coord, vel), 1)]
+
+    def conectar_direcciones(self, direcciones: List[Tuple[int, Tuple[int]]]) -> Dict[Tuple, Dict[Tuple, g.Arista]]:
+        '''
+        Vértices virtuales para una consulta: conecta cada dirección [codigo de via, (x, y)] con sus cruces
+        (ver _conectar_direccion_) mediante aristas virtuales, sin modificar el grafo, y devuelve la superposición
+        que se pasa a camino_minimo y get_instrucciones. Con codigo None, las coordenadas se sitúan en el tramo de
+        calle más cercano, de modo que sirve para puntos cualesquiera.
+        '''
+
+        return self.grafo.aristas_virtuales([a for codigo, coord in direcciones for a in self._conectar_direccion_(codigo, coord)])
+
+    def snap(self, coord: Tuple[int]) -> Tuple[Tuple, Tuple, Tuple[float], float]:
+        '''
+        Sitúa unas coordenadas cualesquiera sobre el callejero. Devuelve los dos cruces del tramo de calle más
+        cercano, el punto proyectado sobre él y la distancia hasta él.
+        '''
+
+        return self.espacial.snap(coord)
+
+    def _aristas_camino_(self, camino: List[Tuple], virtuales: Dict = None) -> List[g.Arista]:
+        '''
+        Aristas consecutivas de un camino, incluidas las virtuales de la consulta.
+        '''
 
-    def get_instrucciones(self, camino: List[Tuple]):
-        """
-        Obtiene las instrucciones del camino entre origen y destino con todos los detalles pertinentes
-        
-        """
         aristas = []
-        giros = {'direccion': [], 'longitud': [],'calle': []}
+        virtuales = virtuales if virtuales else {}
 
         for i in range(len(camino)-1):
-            v = self.grafo.vertices[camino[i]]
-            ar = v.adyacencia[camino[i+1]]
-            aristas.append(ar)
+            v = self.grafo.vertices.get(camino[i])
+            ar = v.adyacencia.get(camino[i+1]) if v else None
+            aristas.append(ar if ar else virtuales[camino[i]][camino[i+1]])
+
+        return aristas
+
+    def _giros_(self, aristas: List[g.Arista]) -> Dict[str, List]:
+        '''
+        Giros de una ruta: metros avanzados, calle y dirección de cada giro.
+        '''
+
+        giros = {'direccion': [], 'longitud': [],'calle': []}
+        if not aristas: return giros
 
         i = 1
         lon = aristas[0].data.longitud//100
@@ -207,9 +459,7 @@ class Navegador():
             else:
                 giros['longitud'].append(lon)
                 codigo = aristas[i].data.codigo
-                direc = self.direcciones.loc[self.direcciones['Codigo de via'] == codigo].iloc()[0]
-                calle = direc['Clase de la via'].strip().lower()+' '+direc['Partícula de la vía'].strip().lower()+' '+direc['Nombre de la vía'].strip().lower()
-                giros['calle'].append(calle)
+                giros['calle'].append(self.nombres_calles.get(codigo, ''))
                 lon = aristas[i].data.longitud//100
                 if aristas[i-1].origen[1] < aristas[i-1].destino[1]:
                     if aristas[i].origen[0] < aristas[i].destino[0]:
@@ -222,6 +472,20 @@ class Navegador():
                     else:
                         giros['direccion'].append('derecha')
             i += 1
+
+        return giros
+
+    def get_instrucciones(self, camino: List[Tuple], virtuales: Dict = None):
+        """
+        Obtiene las instrucciones del camino entre origen y destino con todos los detalles pertinentes
+        (virtuales: vértices virtuales de la consulta, ver conectar_direcciones)
+        """
+        return self._texto_instrucciones_(self._giros_(self._aristas_camino_(camino, virtuales)))
+
+    def _texto_instrucciones_(self, giros: Dict[str, List]) -> str:
+        '''
+        Texto de las instrucciones a partir de los giros de la ruta (ver _giros_).
+        '''
         
         text = ''
         
@@ -230,47 +494,41 @@ class Navegador():
 
         return text
 
+    def _mapa_(self) -> MapaBase:
+        '''
+        Capa fija del mapa, que se vuelve a preparar si han cambiado los vértices o las aristas del grafo (los
+        cambios de pesos, como los del tráfico, no la afectan).
+        '''
+
+        if self.mapa is None or self.mapa.version != self.grafo.version_estructura():
+            self.mapa = MapaBase(self.grafo)
+
+        return self.mapa
+
     def mostrar_ruta(self, inicio: Tuple[int], final: Tuple[int], camino: List[Tuple]) -> None:
         '''
-        Transforma el grafo a NetworkX y muestra por pantalla en una ventana el mapa con la 
-        ruta seleccionada.
+        Muestra por pantalla en una ventana el mapa con la ruta seleccionada. La red de calles se prepara una
+        sola vez (ver mapa.MapaBase) y en cada ruta solo se dibuja su polilínea.
 
-        -> inicion: vertice inicial
+        -> inicio: vertice inicial
         -> final: vertice final
         -> camino: Lista de vértices de la ruta
         '''
-        
-        if not self.xgrafo:
 
-            self.xgrafo = self.grafo.convertir_a_NetworkX()
-        
-
-        ruta_grafo = g.Grafo(False)
-        ruta_grafo.agregar_vertices_mult(camino)
-        aux = None
-        for v in camino:
-            if aux:
-                ruta_grafo.agregar_arista(aux,v)
-            aux=v
-        rutx = ruta_grafo.convertir_a_NetworkX()
-
-        color_map = []
-        for v in rutx:        
-            if v == inicio:
-                color_map.append('green')
-            elif v == final:
-                color_map.append('blue')
-            else:
-                color_map.append('red')
+        self._mapa_().mostrar(camino, inicio, final)
 
+    def imagen_ruta(self, inicio: Tuple[int], final: Tuple[int], camino: List[Tuple], destino: str or BinaryIO = None, formato: str = 'png', ancho: float = 8, dpi: int = 100) -> bytes or None:
+        '''
+        Imagen del mapa con la ruta, sin pantalla, como PNG, SVG u otro formato de matplotlib. La red de calles
+        se rasteriza una sola vez por tamaño de imagen (ver mapa.MapaBase.guardar).
 
-        if not inicio in self.pos: self.pos[inicio] = inicio
-        if not final in self.pos: self.pos[final] = final
+        -> inicio, final, camino: como en mostrar_ruta
+        -> destino: fichero (ruta o fichero binario abierto) donde se escribe; si no se indica, se devuelven los bytes
+        -> formato: 'png' o 'svg'
+        -> ancho, dpi: ancho de la imagen en pulgadas y resolución
+        '''
 
-        plot = plt.plot()
-        nx.draw(self.xgrafo,with_labels=False,pos=self.pos, node_size=10, node_color='grey', edge_color='grey')
-        nx.draw(rutx, pos=self.pos, node_size=12,node_color=color_map, width=3, edge_color='red')
-        plt.show()
+        return self._mapa_().guardar(camino, inicio, final, destino, formato, ancho, dpi)
                       
     def run(self):
         '''
@@ -295,40 +553,53 @@ class Navegador():
                 ruta = self._seleccionar_tipo_ruta_()
                 f.clear()
 
-                self._añadir_direccion_grafo_(origen[0], origen[1])
-                self._añadir_direccion_grafo_(destino[0], destino[1])
-                self.cambiar_ruta(ruta.lower())
-
-                camino = self.grafo.camino_minimo(origen[1], destino[1])
+                self.cambiar_ruta(ruta.strip().lower())
 
-                instrucciones = self.get_instrucciones(camino)
-                print(f'{ALPHA}DIRECCIONES{END}\n')
-                print(instrucciones)
-                self.mostrar_ruta(origen[1], destino[1], camino)
+                resultado = self.calcular_ruta(origen, destino)
+                if not resultado:
+                    f._pop_error_('No existe ruta entre las direcciones')
+                else:
+                    print(f'{ALPHA}DIRECCIONES{END}\n')
+                    print(resultado['texto'])
+                    self.mostrar_ruta(origen[1], destino[1], [tuple(v) for v in resultado['camino']])
             
             f.clear()
 
         print('CERRANDO NAVEGADOR...', end='')
         print('DONE')
 
-def arrancar_navegador() -> Navegador:
+RUTA_SNAPSHOT = 'callejero.snap'
+
+def arrancar_navegador(jerarquias: bool = False, landmarks: bool = False) -> Navegador:
     '''
-    Arranca el navegador del GPS
+    Arranca el navegador del GPS. Si existe un snapshot del grafo construido a partir del fichero de cruces actual
+    (cruces.csv o su copia columnar, ver fuente_dataset) lo abre en lugar de reconstruir el grafo; si no, lo
+    construye y guarda el snapshot para el siguiente arranque.
+
+    -> jerarquias: si es True, carga (o construye y guarda la primera vez) las jerarquías de contracción
+    de cada tipo de ruta para acelerar las consultas
+    -> landmarks: si es True, carga (o construye y guarda la primera vez) las tablas de landmarks para A*
     '''
     
     f.clear()
     s = time.perf_counter()
     print('ARRANCANDO NAVEGADOR....')
-    cruces, direcciones = _cargar_datos_()
-    G = cargar_y_unir_cruces_por_calle(cruces)
-    codigos_validos = []
-    for a in G.aristas:
-        if not a.data.codigo in codigos_validos: codigos_validos.append(a.data.codigo)
+    #El fichero del que se leen los cruces (el CSV o su copia columnar) es el que identifica el snapshot
+    fuentes = [fuente_dataset('cruces')]
+    G = cargar_snapshot(RUTA_SNAPSHOT, fuentes)
+    if G is None:
+        G = cargar_y_unir_cruces_por_calle(_cargar_cruces_())
+        guardar_snapshot(G, RUTA_SNAPSHOT, fuentes)
+    direcciones = _cargar_direcciones_()
+    calles = IndiceCalles.desde_grafo(G)
+    espacial = IndiceEspacial.desde_grafo(G)
+    ch = cargar_o_construir_jerarquias(G, G.perfiles, fuentes=fuentes) if jerarquias else None
+    alt = cargar_o_construir_landmarks(G, G.perfiles, fuentes=fuentes) if landmarks else None
     e = time.perf_counter()
     f.clear()
     print(f'NAVEGADOR LISTO ({e-s} segundos)')
 
-    return Navegador(G, direcciones, codigos_validos)
+    return Navegador(G, direcciones, calles.codigos, ch, alt, calles, espacial)
 
 if __name__ == '__main__':
 
@@ -3,11 +3,13 @@
 # * Andrés Martínez Fuentes
 
 import sys
-from typing import Dict, List, Tuple
+import heapq
+from itertools import chain, count
+from typing import Callable, Dict, Iterable, List, Tuple, ValuesView
 from dataclasses import dataclass, field
+import numpy as np
 import networkx as nx
 import matplotlib.pyplot as plt
-from copy import deepcopy
 
 INFTY = sys.float_info.max
 
@@ -18,6 +20,7 @@ class Arista:
     destino: object = field()
     data: object = field()
     weight: float = field()
+    pesos: Dict[str, float] = field(default_factory=dict) #Peso de la arista en cada perfil (ver Grafo.agregar_perfil)
 
     def __contains__(self, n: object):
         return True if (self.origen == n or self.destino == n) else False
@@ -34,6 +37,184 @@ class Vertice:
 
         return word
 
+#### Núcleos de búsqueda ####
+#Comunes a Grafo y GrafoCSR (ver grafo_csr.py): recorren el grafo a través de una función vecinos(v) que da los
+#pares (w, peso) de las aristas de salida de v, sin depender de cómo se guarda la adyacencia. Las listas de
+#prioridad son montículos binarios (heapq) con borrado perezoso, y un contador desempata en orden de inserción.
+
+def _busqueda_dijkstra_(vecinos: Callable[[object], Iterable[Tuple[object, float]]], origen: object, padre: Dict[object, object], d: Dict[object, float], destino: object=None) -> Tuple[Dict[object, object], Dict[object, float]]:
+    '''
+    Dijkstra desde "origen", deteniéndose al visitar "destino" si se indica. Escribe en "padre" y "d", que deben
+    contener ya todos los vértices alcanzables (padre None y distancia INFTY), y los devuelve.
+
+    Los empates de distancia se deshacen como en la versión con listas, que reordenaba la lista entera tras cada
+    vértice con una ordenación estable: entre vértices a la misma distancia sale antes el que la alcanzó en una
+    ronda (vértice extraído) anterior; en la misma ronda, el que ya estaba en la lista, según su distancia y su
+    orden anteriores, y después los nuevos en el orden en que se encontraron. "orden" guarda esa clave para cada
+    vértice: (ronda, distancia anterior, orden anterior) o (ronda, INFTY, n-ésimo vértice nuevo).
+    '''
+
+    d[origen] = 0
+    orden = {origen: (0,)}
+    nuevos = count()
+    q = [(0, orden[origen], origen)]
+    ronda = 0
+
+    while q:
+        d_v, _, v = heapq.heappop(q)
+        #Entrada obsoleta: el vértice ya se extrajo con una distancia menor
+        if d_v > d[v]: continue
+        ronda += 1
+        for w, peso in vecinos(v):
+            d_w = d_v + peso
+            if d[w] > d_w:
+                #Si mejora dos veces en la misma ronda conserva la posición de la primera
+                if w not in orden: orden[w] = (ronda, INFTY, next(nuevos))
+                elif orden[w][0] != ronda: orden[w] = (ronda, d[w], orden[w])
+                d[w] = d_w
+                padre[w] = v
+                heapq.heappush(q, (d_w, orden[w], w))
+        if v == destino: break
+
+    return padre, d
+
+def _busqueda_a_estrella_(vecinos: Callable[[object], Iterable[Tuple[object, float]]], origen: object, destino: object, heuristica: Callable[[object, object], float]) -> Dict[object, object]:
+    '''
+    A* de "origen" a "destino" con una heurística admisible. Devuelve los padres de los vértices alcanzados.
+    '''
+
+    padre = {origen: None}
+    d = {origen: 0}
+    orden = count()
+    q = [(heuristica(origen, destino), next(orden), 0, origen)]
+
+    while q:
+        _, _, d_v, v = heapq.heappop(q)
+        if d_v > d[v]: continue
+        if v == destino: break
+        for w, peso in vecinos(v):
+            d_w = d_v + peso
+            if d_w < d.get(w, INFTY):
+                d[w] = d_w
+                padre[w] = v
+                heapq.heappush(q, (d_w + heuristica(w, destino), next(orden), d_w, w))
+
+    return padre
+
+def _busqueda_bidireccional_(salida: Callable[[object], Iterable[Tuple[object, float]]], entrada: Callable[[object], Iterable[Tuple[object, float]]], origen: object, destino: object) -> List[object]:
+    '''
+    Dijkstra bidireccional: una búsqueda avanza desde el origen por "salida" y otra desde el destino por
+    "entrada" (aristas de entrada, como pares (u, peso) de cada arista u -> v). Devuelve el camino, o [origen]
+    si el destino no es alcanzable.
+    '''
+
+    if origen == destino: return [origen]
+
+    adyacencias = (salida, entrada)
+    d = ({origen: 0}, {destino: 0})
+    padre = ({origen: None}, {destino: None})
+    visitado = (set(), set())
+    orden = count()
+    q = ([(0, next(orden), origen)], [(0, next(orden), destino)])
+
+    mu = INFTY
+    encuentro = None
+    while q[0] and q[1] and q[0][0][0] + q[1][0][0] < mu:
+        #Se avanza la búsqueda cuya cola tiene la menor distancia pendiente
+        i = 0 if q[0][0][0] <= q[1][0][0] else 1
+        d_v, _, v = heapq.heappop(q[i])
+        if v in visitado[i]: continue
+        visitado[i].add(v)
+        for w, peso in adyacencias[i](v):
+            d_w = d_v + peso
+            if d_w < d[i].get(w, INFTY):
+                d[i][w] = d_w
+                padre[i][w] = v
+                heapq.heappush(q[i], (d_w, next(orden), w))
+            if w in d[1-i] and d[i][w] + d[1-i][w] < mu:
+                mu = d[i][w] + d[1-i][w]
+                encuentro = w
+
+    if encuentro is None: return [origen]
+
+    camino = []
+    aux = encuentro
+    while aux is not None:
+        camino.append(aux)
+        aux = padre[0][aux]
+    camino.reverse()
+    aux = padre[1][encuentro]
+    while aux is not None:
+        camino.append(aux)
+        aux = padre[1][aux]
+
+    return camino
+
+def _reconstruir_camino_(padre: Dict[object, object], origen: object, destino: object) -> List[object]:
+    '''
+    Camino de "origen" a "destino" siguiendo los padres de una búsqueda (solo [origen] si no se alcanzó).
+    '''
+
+    aux = destino
+    camino = []
+    while padre.get(aux) is not None:
+        camino.append(aux)
+        aux = padre[aux]
+    camino.append(origen)
+
+    return camino[::-1]
+
+def _arbol_prim_(vertices: Iterable[object], vecinos: Callable[[object], Iterable[Tuple[object, float]]], padre: Dict[object, object], coste_minimo: Dict[object, float]) -> Dict[object, object]:
+    '''
+    Bosque abarcador mínimo con el algoritmo de Prim: un árbol por componente conexa, partiendo de sus vértices
+    en orden, con un montículo por coste mínimo. Escribe en "padre" y "coste_minimo", que deben contener ya
+    todos los vértices (padre None y coste INFTY), y devuelve "padre".
+    '''
+
+    en_arbol = set()
+    orden = count()
+
+    for raiz in vertices:
+        if raiz in en_arbol: continue
+        q = [(0, next(orden), raiz)]
+        while q:
+            _, _, v = heapq.heappop(q)
+            if v in en_arbol: continue
+            en_arbol.add(v)
+            for w, peso in vecinos(v):
+                if w not in en_arbol and peso < coste_minimo[w]:
+                    coste_minimo[w] = peso
+                    padre[w] = v
+                    heapq.heappush(q, (peso, next(orden), w))
+
+    return padre
+
+def _arbol_kruskal_(vertices: Iterable[object], aristas: Iterable[Tuple[object, object]]) -> List[Tuple[object, object]]:
+    '''
+    Árbol abarcador mínimo con el algoritmo de Kruskal sobre las aristas (s, t) ya ordenadas por peso, con una
+    estructura union-find con compresión de caminos y unión por rango.
+    '''
+
+    raiz = {v: v for v in vertices}
+    rango = {v: 0 for v in raiz}
+
+    def buscar(v: object) -> object:
+        r = v
+        while raiz[r] != r: r = raiz[r]
+        while raiz[v] != r: raiz[v], v = r, raiz[v]
+        return r
+
+    aristas_aam = []
+    for s, t in aristas:
+        r_s, r_t = buscar(s), buscar(t)
+        if r_s != r_t:
+            aristas_aam.append((s, t))
+            if rango[r_s] < rango[r_t]: r_s, r_t = r_t, r_s
+            raiz[r_t] = r_s
+            if rango[r_s] == rango[r_t]: rango[r_s] += 1
+
+    return aristas_aam
+
 class Grafo:
     #Diseñar y construir la clase grafo
 
@@ -47,8 +228,25 @@ class Grafo:
         """
 
         self.vertices: Dict[object, Vertice] = {}
-        self.aristas: List[Arista] = []
+        #Índice de aristas por (origen, destino), en orden de inserción
+        self._aristas: Dict[Tuple[object, object], Arista] = {}
+        #Adyacencia de entrada de cada vértice (solo en grafos dirigidos; en los no dirigidos es la de salida)
+        self._entrantes: Dict[object, Dict[object, Arista]] = {}
+        #Perfiles de pesos: cada Arista guarda en "pesos" el valor de cada uno, calculado al añadirla
+        self.perfiles: Dict[str, Callable[[Arista], float]] = {}
         self.dirigido: bool = dirigido
+        #Contador de modificaciones (aristas y pesos), para invalidar resultados calculados sobre versiones anteriores
+        self.version: int = 0
+        #Modificaciones que solo cambian los pesos de un perfil (None: "weight"), ver version_perfil
+        self._cambios_pesos: Dict[str, int] = {}
+
+    @property
+    def aristas(self) -> ValuesView[Arista]:
+        '''
+        Aristas del grafo (vista de solo lectura sobre el índice de aristas, en orden de inserción)
+        '''
+
+        return self._aristas.values()
 
     def __str__(self):
         word = ''
@@ -73,6 +271,7 @@ class Grafo:
         Returns: None
         """
         self.vertices[data] = Vertice(data)
+        if self.dirigido: self._entrantes[data] = {}
 
     def agregar_vertices_mult(self, mult_v: List[object]):
         '''
@@ -81,7 +280,7 @@ class Grafo:
         -> mult_v: List de objetos (iterable)
         '''
 
-        for obj in mult_v: self.vertices[obj] = Vertice(obj)
+        for obj in mult_v: self.agregar_vertice(obj)
 
     def agregar_arista(self, s: object, t: object, data: object=None, weight: float=1) -> None:
         """ Si los objetos s y t son vértices del grafo, agrega
@@ -97,19 +296,24 @@ class Grafo:
         Returns: None
         """
 
-        if s and t in self.vertices:
-            #Crear Arista y añadirla a la lista de aristas
+        if s in self.vertices and t in self.vertices:
+            #Crear Arista y añadirla al índice de aristas
             a = Arista(s, t, data, weight)
+            if self.perfiles: a.pesos = {perfil: peso(a) for perfil, peso in self.perfiles.items()}
             if self.dirigido:
                 #Si el grafo es dirigido sólo se añade la Arista a la lista de adyacencia del Vertice de origen
-                self.aristas.append(a)
+                #(y a la de entrada del de destino). Si ya existía una arista s -> t, se sustituye
+                self._aristas[(s, t)] = a
                 self.vertices[s].adyacencia[t] = a
+                self._entrantes[t][s] = a
+                self.version += 1
             else:
                 if not s in self.vertices[t].adyacencia:
-                    self.aristas.append(a)
+                    self._aristas[(s, t)] = a
                     #Si no es dirigido, añado la Arista a la lista de adyacincia de ambos Vertices
                     self.vertices[s].adyacencia[t] = a
                     self.vertices[t].adyacencia[s] = a
+                    self.version += 1
         
     def agregar_aristas_mult(self, mult_arist: List[Tuple]) -> None:
         '''
@@ -121,6 +325,139 @@ class Grafo:
 
         for arist in mult_arist: self.agregar_arista(*arist)
 
+    def agregar_perfil(self, perfil: str, peso: Callable[[Arista], float]) -> None:
+        '''
+        Añade (o redefine) un perfil de pesos: calcula peso(arista) para todas las aristas y lo guarda en su
+        diccionario "pesos". Las aristas añadidas después también lo reciben. Los algoritmos usan el perfil
+        indicado en su parámetro "perfil" (o "weight" si no se indica), sin modificar el grafo.
+
+        -> perfil: nombre del perfil ('corta', 'rapida', ...)
+        -> peso: función que da el peso de cada Arista en el perfil
+        '''
+
+        self.perfiles[perfil] = peso
+        for a in self._aristas.values(): a.pesos[perfil] = peso(a)
+        self.version += 1
+        self._cambios_pesos[perfil] = self._cambios_pesos.get(perfil, 0) + 1
+
+    def actualizar_pesos(self, cambios: Iterable[Tuple[object, object, float]], perfil: str=None, publicar: bool=True) -> List[Tuple[object, object, float, float]]:
+        '''
+        Cambia en bloque los pesos de varias aristas en un perfil (o su peso "weight" si no se indica). Los pesos
+        deben cambiarse con este método, y no escribiendo en la Arista, para que cambie la versión del grafo, que
+        aumenta una sola vez por bloque. En un grafo no dirigido, s -> t y t -> s son la misma arista.
+
+        -> cambios: tuplas (s, t, peso); las aristas que no existen se ignoran
+        -> perfil: perfil de pesos
+        -> publicar: si es False, la versión no cambia hasta llamar a publicar_pesos, para poder corregir antes
+        las estructuras que dependen de los pesos; mientras tanto, lo calculado queda con la versión anterior
+        Devuelve los cambios aplicados como tuplas (s, t, peso anterior, peso nuevo), para poder actualizar
+        estructuras calculadas a partir de los pesos (ver Landmarks.actualizar).
+        '''
+
+        aplicados = []
+        for s, t, peso in cambios:
+            a = self.vertices[s].adyacencia.get(t) if s in self.vertices else None
+            if not a: continue
+            if perfil:
+                aplicados.append((s, t, a.pesos[perfil], peso))
+                a.pesos[perfil] = peso
+            else:
+                aplicados.append((s, t, a.weight, peso))
+                a.weight = peso
+
+        if aplicados and publicar: self.publicar_pesos(perfil)
+
+        return aplicados
+
+    def publicar_pesos(self, perfil: str=None) -> None:
+        '''
+        Aumenta la versión del grafo por un cambio de pesos del perfil (ver actualizar_pesos), de modo que se dejan
+        de usar los resultados calculados con los pesos anteriores.
+        '''
+
+        self.version += 1
+        self._cambios_pesos[perfil] = self._cambios_pesos.get(perfil, 0) + 1
+
+    def actualizar_peso(self, s: object, t: object, peso: float, perfil: str=None) -> bool:
+        '''
+        Cambia el peso de la arista s -> t en un perfil (o su peso "weight" si no se indica), ver actualizar_pesos.
+        Devuelve False si la arista no existe.
+        '''
+
+        return bool(self.actualizar_pesos([(s, t, peso)], perfil))
+
+    def version_perfil(self, perfil: str=None) -> int:
+        '''
+        Versión del grafo para los resultados calculados con un perfil: cambia con las aristas y con los pesos de
+        ese perfil, pero no con los de los demás, de modo que actualizar un perfil (por ejemplo, el del tráfico)
+        no invalida lo calculado con otros.
+        '''
+
+        return self.version - sum(self._cambios_pesos.values()) + self._cambios_pesos.get(perfil, 0)
+
+    def version_estructura(self) -> int:
+        '''
+        Versión de la estructura del grafo (vértices y aristas): cambia con cualquier vértice o arista añadido o
+        eliminado, pero no con los cambios de pesos de ningún perfil.
+        '''
+
+        return self.version - sum(self._cambios_pesos.values())
+
+    def aristas_virtuales(self, mult_arist: List[Tuple]) -> Dict[object, Dict[object, Arista]]:
+        '''
+        Crea aristas sin añadirlas al grafo, como una superposición de adyacencia {v: {w: arista v->w}} que se
+        puede pasar a los algoritmos de búsqueda (parámetro "virtuales"). Permite conectar vértices temporales
+        (por ejemplo, puntos situados sobre una arista) durante una consulta sin modificar el grafo, de modo que
+        este puede compartirse entre varias consultas a la vez. Las aristas reciben el peso de cada perfil del grafo.
+
+        -> mult_arist: lista de tuplas (origen, destino, data, weight), como en agregar_aristas_mult
+        '''
+
+        virtuales = {}
+
+        def agregar(s: object, t: object, data: object=None, weight: float=1) -> None:
+            a = Arista(s, t, data, weight)
+            if self.perfiles: a.pesos = {perfil: peso(a) for perfil, peso in self.perfiles.items()}
+            virtuales.setdefault(s, {})[t] = a
+            if not self.dirigido: virtuales.setdefault(t, {})[s] = a
+
+        for arist in mult_arist: agregar(*arist)
+
+        return virtuales
+
+    def _vecinos_(self, v: object, virtuales: Dict[object, Dict[object, Arista]]) -> Iterable[Tuple[object, Arista]]:
+        '''
+        Aristas de salida de v (pares (w, arista)), incluidas las de la superposición de aristas virtuales.
+        '''
+
+        base = self.vertices[v].adyacencia.items() if v in self.vertices else ()
+        extra = virtuales.get(v)
+
+        return chain(base, extra.items()) if extra else base
+
+    def _vecinos_con_peso_(self, perfil: str=None, virtuales: Dict[object, Dict[object, Arista]]=None, entrantes: bool=False) -> Callable[[object], List[Tuple[object, float]]]:
+        '''
+        Función vecinos(v) para los núcleos de búsqueda: pares (w, peso) de las aristas de salida de v (o de las de
+        entrada, con "entrantes") con el peso del perfil, incluidas las de la superposición de aristas virtuales.
+        '''
+
+        vacio = {}
+        if entrantes and self.dirigido:
+            adyacencia = self._entrantes
+            propias = lambda v: adyacencia.get(v, vacio)
+            virtuales = self._invertir_virtuales_(virtuales) if virtuales else None
+        else:
+            vertices = self.vertices
+            propias = lambda v: vertices[v].adyacencia if v in vertices else vacio
+        if virtuales:
+            aristas = lambda v: chain(propias(v).items(), virtuales.get(v, vacio).items())
+        else:
+            aristas = lambda v: propias(v).items()
+
+        if perfil: return lambda v: [(w, a.pesos[perfil]) for w, a in aristas(v)]
+
+        return lambda v: [(w, a.weight) for w, a in aristas(v)]
+
     def eliminar_vertice(self, v: object) -> None:
         """ Si el objeto v es un vértice del grafo lo elimina.
         Si no, no hace nada.
@@ -129,25 +466,28 @@ class Grafo:
         Returns: None
         """
 
-        #Eliminar aristas de su adyacencia de la lista de aristas y de la adyacencia de otros |
-        #                                                                                     | => Vertice eliminado
-        #Eliminar vertice de los vertices y de la adyacencia de otros                         |
+        #Eliminar aristas de su adyacencia del índice de aristas y de la adyacencia de otros |
+        #                                                                                    | => Vertice eliminado
+        #Eliminar vertice de los vertices y de la adyacencia de otros                        |
         
         v_obj = self.vertices.get(v, None)
         if v_obj:
             if self.dirigido:
-                # * ¿Adyacencia de entrada para no tener que recorrer todas las aristas si es dirijido?
-                for a in self.aristas:
-                    if v in a:
-                        self.aristas.remove(a)
-                        w = a.origen if a.origen != v else a.destino
-                        del self.vertices[w].adyacencia[v]
-            else:
+                #Aristas de salida (v -> w) y de entrada (u -> v), sin recorrer todas las aristas
                 for w in v_obj.adyacencia:
+                    del self._aristas[(v, w)]
+                    self._entrantes[w].pop(v, None)
+                for u in self._entrantes.pop(v):
+                    if u != v:
+                        del self.vertices[u].adyacencia[v]
+                        del self._aristas[(u, v)]
+            else:
+                for w in list(v_obj.adyacencia):
                     a = self.vertices[w].adyacencia.pop(v)
-                    self.aristas.remove(a)
+                    self._aristas.pop((a.origen, a.destino), None)
             #Eliminar de la lista de vértices
             del self.vertices[v]
+            self.version += 1
 
     def eliminar_arista(self, s: object, t: object) -> None:
         """ Si los objetos s y t son vértices del grafo y existe
@@ -160,24 +500,19 @@ class Grafo:
         Returns: None
         """
 
-        if s and t in self.vertices:
+        if s in self.vertices and t in self.vertices:
            
-            if self.dirigido:
-                #Comprobar que la Arista existe exactamente con ese origen y ese destino y la eliminarla
-                for a in self.aristas:
-                    if a.origen == s and a.destino == t:
-                        self.aristas.remove(a)
-                        del self.vertices[s].adyacencia[t]
+            a = self.vertices[s].adyacencia.pop(t, None)
+            if a:
+                self.version += 1
+                del self._aristas[(a.origen, a.destino)]
+                if self.dirigido:
+                    del self._entrantes[t][s]
+                else:
+                    #En un grafo no dirigido la Arista también está en la lista de adyacencia de t
+                    self.vertices[t].adyacencia.pop(s, None)
 
-            else:
-                #Comprobar que la Arista exista con esos Vértices y eliminarla de las listas de adyacencia de ambos
-                for a in self.aristas:
-                    if s in a and t in a:
-                        self.aristas.remove(a)
-                        del self.vertices[s].adyacencia[t]
-                        del self.vertices[t].adyacencia[s]
-
-    def obtener_arista(self, s: object, t: object) -> Tuple[object, float] or None:
+    def obtener_arista(self, s: object, t: object, perfil: str=None) -> Tuple[object, float] or None:
         """
         Si los objetos s y t son vértices del grafo y existe
         una arista de u a v, devuelve sus datos y su peso en una tupla.
@@ -186,17 +521,14 @@ class Grafo:
         Args:
             s: vértice de origen de la arista
             t: vértice de destino de la arista
+            perfil: perfil de pesos (opcional, por defecto "weight")
         Returns: Una tupla (a,w) con los datos de la arista "a" y su peso
         "w" si la arista existe. None en caso contrario.
         """
 
-        if s and t in self.vertices:
-            if self.dirigido:
-                for a in self.aristas:
-                    if a.origen == s and a.destino == t: return (a.data, a.weight)
-            else:
-                for a in self.aristas:
-                    if s in a and t in a: return (a.data, a.weight)
+        if s in self.vertices and t in self.vertices:
+            a = self.vertices[s].adyacencia.get(t)
+            if a: return (a.data, a.pesos[perfil] if perfil else a.weight)
 
         return None
 
@@ -242,9 +574,7 @@ class Grafo:
 
         c = 0
         if v in self.vertices:
-            if self.dirigido:
-                for a in self.aristas:
-                    if a.destino == v: c += 1
+            if self.dirigido: c = len(self._entrantes[v])
             else: c = self.grado_saliente(v)
     
         return c if c else None
@@ -265,127 +595,392 @@ class Grafo:
         return None
 
     #### Algoritmos #### ultimas
-    def dijkstra(self, origen: object)-> Dict[object,object]:
+    def _dijkstra_(self, origen: object, destino: object=None, perfil: str=None, virtuales: Dict[object, Dict[object, Arista]]=None) -> Tuple[Dict[object,object], Dict[object,float]]:
+        '''
+        Motor común de Dijkstra. La lista de prioridad es un montículo binario (heapq) con borrado perezoso:
+        cada mejora de d[w] inserta una nueva entrada y las entradas obsoletas se descartan al extraerlas, en
+        lugar de reordenar la lista entera tras cada vértice. Los empates se deshacen como en la versión con
+        listas (ver _busqueda_dijkstra_), por lo que el árbol de padres es el mismo.
+
+        -> origen: vértice de origen
+        -> destino: si se indica, la búsqueda se detiene al visitar este vértice
+        -> perfil: perfil de pesos (ver agregar_perfil); si no se indica se usa el peso "weight" de las aristas
+        -> virtuales: aristas temporales de la consulta (ver aristas_virtuales)
+        Devuelve una tupla (padre, d) con los padres y las distancias desde "origen".
+        '''
+
+        padre =  {v: None for v in self.vertices}
+        d = {v: INFTY for v in self.vertices}
+        for v, ady in (virtuales or {}).items():
+            for w in chain((v,), ady):
+                padre.setdefault(w, None)
+                d.setdefault(w, INFTY)
+
+        return _busqueda_dijkstra_(self._vecinos_con_peso_(perfil, virtuales), origen, padre, d, destino)
+
+    def dijkstra(self, origen: object, perfil: str=None)-> Dict[object,object]:
         """
         Calcula un Árbol Abarcador Mínimo para el grafo partiendo
         del vértice "origen" usando el algoritmo de Dijkstra. Calcula únicamente
         el árbol de la componente conexa que contiene a "origen".
         
-        Args: origen vértice del grafo de origen
+        Args:
+            origen: vértice del grafo de origen
+            perfil: perfil de pesos (opcional)
         Returns: Devuelve un diccionario que indica, para cada vértice alcanzable
         desde "origen", qué vértice es su padre en el árbol abarcador mínimo.
         """
-        
-        padre =  {v: None for v in self.vertices}
-        visitado = {v: False for v in self.vertices}
-        d = {v: INFTY for v in self.vertices}
-        
-        d[origen] = 0
-        q = [origen]
 
-        while q:
-            v = q.pop(0)
-            if not visitado[v]:
-                visitado[v] = True
-                for w in self.vertices[v].adyacencia: # mirar si es mejor keys
-                    if d[w] > (d[v] + self.vertices[v].adyacencia[w].weight):
-                        d[w] = d[v] + self.vertices[v].adyacencia[w].weight
-                        padre[w] = v
-                        q.append(w)
-                q.sort(key=lambda x: d[x])
-        return padre
-
-    def dijkstra_min(self, origen: object, destino: object) -> Dict[object, object]:
+        return self._dijkstra_(origen, perfil=perfil)[0]
+
+    def dijkstra_distancias(self, origen: object, destino: object=None, perfil: str=None, virtuales: Dict[object, Dict[object, Arista]]=None) -> Tuple[Dict[object,object], Dict[object,float]]:
+        """
+        Igual que dijkstra (o dijkstra_min si se indica "destino"), pero devuelve
+        también el mapa de distancias.
+
+        Args:
+            origen: vértice del grafo de origen
+            destino: vértice en el que detener la búsqueda (opcional)
+            perfil: perfil de pesos (opcional)
+            virtuales: aristas temporales de la consulta (opcional, ver aristas_virtuales)
+        Returns: Una tupla (padre, d) con el diccionario de padres y el de
+        distancias desde "origen" (INFTY para los vértices no alcanzados).
+        """
+
+        return self._dijkstra_(origen, destino, perfil, virtuales)
+
+    def dijkstra_min(self, origen: object, destino: object, perfil: str=None, virtuales: Dict[object, Dict[object, Arista]]=None) -> Dict[object, object]:
         '''
         Versión acotada del algoritmo de Dijkstra, que permite ejecutarlo hasta haber llegado a un vértice concreto,
         obteniedo la versión parcial del Árbol Abarcador Mínimo que lo contiene y parte del vértice origen.
         '''
 
-        padre =  {v: None for v in self.vertices}
-        visitado = {v: False for v in self.vertices}
-        d = {v: INFTY for v in self.vertices}
-        
-        d[origen] = 0
-        # Inicializar lista de prioridad Q = {origen} ordenada por d.
-        q = [origen]
-
-        while q and not visitado[destino]:
-            v = q.pop(0)
-            if not visitado[v]:
-                visitado[v] = True
-                for w in self.vertices[v].adyacencia: # mirar si es mejor keys
-                    if d[w] > (d[v] + self.vertices[v].adyacencia[w].weight):
-                        d[w] = d[v] + self.vertices[v].adyacencia[w].weight
-                        padre[w] = v
-                        q.append(w)
-                q.sort(key=lambda x: d[x])
-        return padre
-
-    def camino_minimo(self,origen:object, destino:object) -> List[object]:
-        '''
-        Calcula el camino mínimo a partir de una versión acotada del algoritmo de Dijkstra
+        return self._dijkstra_(origen, destino, perfil, virtuales)[0]
+
+    def a_estrella(self, origen: object, destino: object, heuristica: Callable[[object, object], float], perfil: str=None, virtuales: Dict[object, Dict[object, Arista]]=None) -> Dict[object, object]:
+        '''
+        Búsqueda A* de "origen" a "destino". La prioridad de cada vértice es su distancia desde el origen más
+        la estimación heuristica(v, destino), que debe ser admisible (no sobreestimar nunca la distancia real)
+        para que el camino obtenido sea mínimo. Con una heurística nula equivale a dijkstra_min. Admite, como
+        los demás algoritmos de búsqueda, un perfil de pesos y aristas virtuales (ver aristas_virtuales).
+
+        Devuelve el diccionario de padres de los vértices alcanzados durante la búsqueda.
+        '''
+
+        return _busqueda_a_estrella_(self._vecinos_con_peso_(perfil, virtuales), origen, destino, heuristica)
+
+    def _adyacencia_entrante_(self) -> Dict[object, Dict[object, Arista]]:
+        '''
+        Adyacencia de entrada de cada vértice ({v: {u: arista u->v}}), necesaria para recorrer un grafo dirigido
+        en sentido inverso. En un grafo no dirigido coincide con la de salida.
+        '''
+
+        if not self.dirigido:
+            return {v: v_obj.adyacencia for v, v_obj in self.vertices.items()}
+
+        return self._entrantes
+
+    def _invertir_virtuales_(self, virtuales: Dict[object, Dict[object, Arista]]) -> Dict[object, Dict[object, Arista]]:
+        '''
+        Superposición de aristas virtuales en sentido inverso ({w: {v: arista v->w}}), para las búsquedas que
+        avanzan hacia atrás. En un grafo no dirigido es la misma.
+        '''
+
+        if not self.dirigido: return virtuales
+
+        entrantes = {}
+        for v, ady in virtuales.items():
+            for w, a in ady.items(): entrantes.setdefault(w, {})[v] = a
+
+        return entrantes
+
+    def dijkstra_bidireccional(self, origen: object, destino: object, perfil: str=None, virtuales: Dict[object, Dict[object, Arista]]=None) -> List[object]:
+        '''
+        Camino mínimo con Dijkstra bidireccional: una búsqueda avanza desde el origen por las aristas de salida
+        y otra desde el destino por las de entrada, alternando siempre la de menor distancia pendiente. Cada vez
+        que una arista relajada toca un vértice alcanzado por la otra búsqueda se actualiza la mejor longitud
+        conocida "mu", y se termina cuando la suma de las cabezas de ambas colas no puede mejorarla.
+
+        Devuelve la lista de vértices del camino (solo [origen] si el destino no es alcanzable).
+        '''
+
+        return _busqueda_bidireccional_(self._vecinos_con_peso_(perfil, virtuales), self._vecinos_con_peso_(perfil, virtuales, entrantes=True), origen, destino)
+
+    def camino_minimo(self,origen:object, destino:object, metodo: str='dijkstra', heuristica: Callable[[object, object], float]=None, perfil: str=None, virtuales: Dict[object, Dict[object, Arista]]=None) -> List[object]:
+        '''
+        Calcula el camino mínimo entre dos vértices.
+
+        -> metodo: 'dijkstra' (versión acotada del algoritmo de Dijkstra), 'a_estrella' (búsqueda A*)
+        o 'bidireccional' (Dijkstra bidireccional)
+        -> heuristica: función heuristica(v, destino) admisible, necesaria para 'a_estrella'
+        -> perfil: perfil de pesos (ver agregar_perfil); por defecto, el peso "weight" de las aristas
+        -> virtuales: aristas temporales de la consulta (ver aristas_virtuales)
         '''
         
-        d_padres = self.dijkstra_min(origen, destino)
-        aux = destino
-        camino = []
-        while d_padres[aux]:
-            camino.append(aux)
-            aux = d_padres[aux]
-        camino.append(origen)
+        if metodo == 'bidireccional':
+            return self.dijkstra_bidireccional(origen, destino, perfil, virtuales)
+        elif metodo == 'dijkstra':
+            d_padres = self.dijkstra_min(origen, destino, perfil, virtuales)
+        elif metodo == 'a_estrella':
+            d_padres = self.a_estrella(origen, destino, heuristica, perfil, virtuales)
+        else:
+            raise ValueError(f'Método de búsqueda desconocido: {metodo}')
+
+        return _reconstruir_camino_(d_padres, origen, destino)
+
+    def _arbol_hasta_(self, destino: object, perfil: str=None, virtuales: Dict[object, Dict[object, Arista]]=None) -> Tuple[Dict[object, float], Dict[object, object]]:
+        '''
+        Árbol de caminos mínimos hacia "destino" (Dijkstra por las aristas de entrada). Devuelve la distancia de
+        cada vértice que puede llegar a destino y el siguiente vértice de su camino mínimo.
+        '''
+
+        entrantes = self._adyacencia_entrante_()
+        virtuales_entrantes = self._invertir_virtuales_(virtuales or {})
+        vacio = {}
 
-        return camino[::-1]
+        h = {destino: 0}
+        siguiente = {destino: None}
+        visitado = set()
+        orden = count()
+        q = [(0, next(orden), destino)]
+        while q:
+            d_v, _, v = heapq.heappop(q)
+            if v in visitado: continue
+            visitado.add(v)
+            for w, a in chain(entrantes[v].items() if v in entrantes else (), virtuales_entrantes.get(v, vacio).items()):
+                d_w = d_v + (a.pesos[perfil] if perfil else a.weight)
+                if d_w < h.get(w, INFTY):
+                    h[w] = d_w
+                    siguiente[w] = v
+                    heapq.heappush(q, (d_w, next(orden), w))
+
+        return h, siguiente
+
+    def _desvio_(self, inicio: object, destino: object, h: Dict[object, float], siguiente: Dict[object, object], excluidos: set, salidas_excluidas: set, perfil: str=None, virtuales: Dict[object, Dict[object, Arista]]=None) -> Tuple[List[object], List[float]]:
+        '''
+        Camino mínimo de "inicio" a "destino" sin pasar por los vértices "excluidos" ni por las aristas de inicio
+        a los vértices de "salidas_excluidas", sin modificar el grafo. Es una búsqueda A* con la distancia exacta
+        "h" del grafo sin restricciones (ver _arbol_hasta_), que es admisible porque excluir aristas solo alarga
+        los caminos. Termina en cuanto extrae un vértice cuyo camino en el árbol de "siguiente" no toca nada
+        excluido, ya que ese camino es entonces mínimo.
+
+        Devuelve el camino y el coste acumulado hasta cada uno de sus vértices, o ([], []) si no existe.
+        '''
+
+        #Validez del camino del árbol desde cada vértice (memorizada): no puede volver a inicio ni tocar excluidos
+        valido = {destino: True, inicio: False}
+        for v in excluidos: valido[v] = False
+
+        def arbol_valido(v: object) -> bool:
+            pendientes = []
+            while v not in valido:
+                pendientes.append(v)
+                v = siguiente[v]
+            for u in pendientes: valido[u] = valido[v]
+            return valido[v]
+
+        d = {inicio: 0}
+        padre = {inicio: None}
+        visitado = set()
+        orden = count()
+        q = [(h[inicio], next(orden), inicio)]
+        while q:
+            _, _, v = heapq.heappop(q)
+            if v in visitado: continue
+            visitado.add(v)
+            if v == inicio:
+                continuar = siguiente[v] not in salidas_excluidas and arbol_valido(siguiente[v])
+            else:
+                continuar = arbol_valido(v)
+            if continuar:
+                camino = []
+                aux = v
+                while aux is not None:
+                    camino.append(aux)
+                    aux = padre[aux]
+                camino.reverse()
+                costes = [d[u] for u in camino]
+                aux = siguiente[v]
+                while aux is not None:
+                    camino.append(aux)
+                    costes.append(d[v] + h[v] - h[aux])
+                    aux = siguiente[aux]
+                return camino, costes
+            for w, a in (self._vecinos_(v, virtuales) if virtuales else self.vertices[v].adyacencia.items()):
+                if w in excluidos or w not in h or (v == inicio and w in salidas_excluidas): continue
+                d_w = d[v] + (a.pesos[perfil] if perfil else a.weight)
+                if d_w < d.get(w, INFTY):
+                    d[w] = d_w
+                    padre[w] = v
+                    heapq.heappush(q, (d_w + h[w], next(orden), w))
+
+        return [], []
+
+    def caminos_alternativos(self, origen: object, destino: object, k: int=3, perfil: str=None, virtuales: Dict[object, Dict[object, Arista]]=None, max_similitud: float=1.0, max_candidatos: int=None) -> List[Tuple[List[object], float]]:
+        '''
+        Hasta k caminos sin ciclos de "origen" a "destino", de menor a mayor coste, con el algoritmo de Yen: cada
+        camino encontrado se desvía en cada uno de sus vértices, excluyendo su prefijo y las aristas ya usadas
+        por los caminos con ese mismo prefijo. Las exclusiones son conjuntos propios de la consulta, de modo que
+        el grafo no se modifica y puede compartirse. Todos los desvíos reutilizan un único árbol de caminos
+        mínimos hacia el destino (ver _desvio_), en lugar de una búsqueda completa por desvío.
+
+        -> k: número máximo de caminos
+        -> perfil: perfil de pesos (ver agregar_perfil); por defecto, el peso "weight" de las aristas
+        -> virtuales: aristas temporales de la consulta (ver aristas_virtuales)
+        -> max_similitud: fracción máxima del coste de un camino que puede compartir con cualquiera de los ya
+        elegidos (1: sin límite); los caminos demasiado parecidos se descartan, pero se siguen desviando
+        -> max_candidatos: número máximo de caminos examinados (por defecto, 10*k), que acota el trabajo cuando
+        max_similitud descarta muchos
+        Devuelve una lista de tuplas (camino, coste).
+        '''
+
+        if origen == destino: return [([origen], 0)]
+
+        h, siguiente = self._arbol_hasta_(destino, perfil, virtuales)
+        if origen not in h: return []
+
+        def clave(u: object, v: object) -> object:
+            return (u, v) if self.dirigido else frozenset((u, v))
+
+        def tramos(camino: List[object], costes: List[float]) -> Dict[object, float]:
+            return {clave(u, v): c_v - c_u for u, v, c_u, c_v in zip(camino, camino[1:], costes, costes[1:])}
+
+        camino, costes = self._desvio_(origen, destino, h, siguiente, set(), set(), perfil, virtuales)
+        orden = count()
+        candidatos = [(costes[-1], next(orden), camino, costes)]
+        vistos = {tuple(camino)}
+        examinados: List[List[object]] = []
+        elegidos: List[Tuple[List[object], float]] = []
+        tramos_elegidos: List[Dict[object, float]] = []
+        max_candidatos = max_candidatos if max_candidatos else 10*k
+
+        while candidatos and len(elegidos) < k and len(examinados) < max_candidatos:
+            coste, _, camino, costes = heapq.heappop(candidatos)
+            examinados.append(camino)
+
+            propios = tramos(camino, costes)
+            if all(sum(c for t, c in propios.items() if t in otros) <= max_similitud*coste for otros in tramos_elegidos):
+                elegidos.append((camino, coste))
+                tramos_elegidos.append(propios)
 
-    def prim(self)-> Dict[object,object]:
+            for i in range(len(camino) - 1):
+                raiz = camino[:i+1]
+                salidas = {p[i+1] for p in examinados if len(p) > i+1 and p[i] == camino[i] and p[:i+1] == raiz}
+                desvio, costes_desvio = self._desvio_(camino[i], destino, h, siguiente, set(raiz[:-1]), salidas, perfil, virtuales)
+                if not desvio: continue
+                nuevo = raiz[:-1] + desvio
+                if tuple(nuevo) in vistos: continue
+                vistos.add(tuple(nuevo))
+                nuevos_costes = costes[:i] + [costes[i] + c for c in costes_desvio]
+                heapq.heappush(candidatos, (nuevos_costes[-1], next(orden), nuevo, nuevos_costes))
+
+        return elegidos
+
+    def matriz_distancias(self, origenes: List[object], destinos: List[object], perfil: str=None, virtuales: Dict[object, Dict[object, Arista]]=None) -> np.ndarray:
+        '''
+        Matriz de distancias de cada origen a cada destino (np.inf si no es alcanzable), con una única búsqueda de
+        Dijkstra por origen que se detiene en cuanto ha asentado todos los destinos, en lugar de una búsqueda por
+        pareja. Cada búsqueda solo guarda los vértices que alcanza, de modo que la memoria adicional no crece con
+        el número de destinos más allá de la propia matriz.
+
+        -> origenes: vértices de origen (filas)
+        -> destinos: vértices de destino (columnas)
+        -> perfil: perfil de pesos (ver agregar_perfil); por defecto, el peso "weight" de las aristas
+        -> virtuales: aristas temporales de la consulta (ver aristas_virtuales)
+        '''
+
+        matriz = np.full((len(origenes), len(destinos)), np.inf)
+        columnas: Dict[object, List[int]] = {}
+        for j, t in enumerate(destinos): columnas.setdefault(t, []).append(j)
+
+        for i, origen in enumerate(origenes):
+            fila = matriz[i]
+            pendientes = len(columnas)
+            d = {origen: 0}
+            visitado = set()
+            orden = count()
+            q = [(0, next(orden), origen)]
+            while q and pendientes:
+                d_v, _, v = heapq.heappop(q)
+                if v in visitado: continue
+                visitado.add(v)
+                if v in columnas:
+                    fila[columnas[v]] = d_v
+                    pendientes -= 1
+                for w, a in (self._vecinos_(v, virtuales) if virtuales else self.vertices[v].adyacencia.items()):
+                    d_w = d_v + (a.pesos[perfil] if perfil else a.weight)
+                    if d_w < d.get(w, INFTY):
+                        d[w] = d_w
+                        heapq.heappush(q, (d_w, next(orden), w))
+
+        return matriz
+
+    def isocrona(self, origen: object, limite: float, perfil: str=None, virtuales: Dict[object, Dict[object, Arista]]=None) -> Tuple[List[object], np.ndarray]:
+        '''
+        Vértices alcanzables desde "origen" con coste menor o igual que "limite" (segundos, metros... según el
+        perfil). Es una búsqueda de Dijkstra que se detiene en cuanto el siguiente vértice supera el límite y
+        que solo guarda los vértices que alcanza, por lo que su coste depende del área alcanzada y no del
+        tamaño del grafo. Devuelve los vértices (en orden de coste creciente, empezando por el origen) y un
+        array con sus costes.
+
+        -> origen: vértice de origen
+        -> limite: coste máximo
+        -> perfil: perfil de pesos (ver agregar_perfil); por defecto, el peso "weight" de las aristas
+        -> virtuales: aristas temporales de la consulta (ver aristas_virtuales)
+        '''
+
+        alcanzados, costes = [], []
+        d = {origen: 0}
+        visitado = set()
+        orden = count()
+        q = [(0, next(orden), origen)]
+        while q:
+            d_v, _, v = heapq.heappop(q)
+            if d_v > limite: break
+            if v in visitado: continue
+            visitado.add(v)
+            alcanzados.append(v)
+            costes.append(d_v)
+            for w, a in (self._vecinos_(v, virtuales) if virtuales else self.vertices[v].adyacencia.items()):
+                d_w = d_v + (a.pesos[perfil] if perfil else a.weight)
+                if d_w <= limite and d_w < d.get(w, INFTY):
+                    d[w] = d_w
+                    heapq.heappush(q, (d_w, next(orden), w))
+
+        return alcanzados, np.array(costes, dtype=np.float64)
+
+    def prim(self, perfil: str=None)-> Dict[object,object]:
         """
         Calcula un Árbol Abarcador Mínimo para el grafo
         usando el algoritmo de Prim.
         
-        Args: None
+        Args: perfil perfil de pesos (opcional)
         Returns: Devuelve un diccionario que indica, para cada vértice del
         grafo, qué vértice es su padre en el árbol abarcador mínimo.
         """
         
         padre =  {v: None for v in self.vertices}
         coste_minimo = {v: INFTY for v in self.vertices}
-        q = [v for v in self.vertices]
 
-        while q:
-            v = q.pop(0)
-            vertice = self.vertices[v]
-            for w in vertice.adyacencia:
-                if w in q and (vertice.adyacencia[w].weight < coste_minimo[w]):
-                    coste_minimo[w] = vertice.adyacencia[w].weight
-                    padre[w] = v
-            q.sort(key=lambda x: coste_minimo[x])
-        
-        return padre
+        #Un árbol por componente conexa, partiendo de sus vértices en orden (ver _arbol_prim_)
+        return _arbol_prim_(self.vertices, self._vecinos_con_peso_(perfil), padre, coste_minimo)
 
-    def kruskal(self)-> List[Tuple[object,object]]:
+    def kruskal(self, perfil: str=None)-> List[Tuple[object,object]]:
         """ Calcula un Árbol Abarcador Mínimo para el grafo
-        usando el algoritmo de Prim.
+        usando el algoritmo de Kruskal.
         
-        Args: None
+        Args: perfil perfil de pesos (opcional)
         Returns: Devuelve una Lista [(s1,t1),(s2,t2),...,(sn,tn)]
         de los pares de vértices del grafo
         que forman las aristas del arbol abarcador mínimo.
         """
-        l = deepcopy(self.aristas)
-        l.sort(key=lambda x: x.weight)
-        c = {} 
-        for v in self.vertices:
-            c[v] = [v]
-        aristas_aam = []
-        while l:
-            a = l.pop(0)
-            if c[a.origen] != c[a.destino]:
-                aristas_aam.append((a.origen,a.destino))
-                for el in c[a.destino]:
-                    c[a.origen].append(el)
-                    c[a.origen].sort()
-                for w in c[a.destino]:
-                    c[w] = c[a.origen]
-        return aristas_aam
+
+        #Las aristas se ordenan por índice, sin copiarlas, y las componentes se mantienen en una
+        #estructura union-find con compresión de caminos y unión por rango (ver _arbol_kruskal_)
+        l = list(self.aristas)
+        indices = sorted(range(len(l)), key=lambda i: l[i].pesos[perfil] if perfil else l[i].weight)
+
+        return _arbol_kruskal_(self.vertices, ((l[i].origen, l[i].destino) for i in indices))
 
 
     #### NetworkX ####
@@ -0,0 +1,390 @@
+'''
+Representación compacta (CSR, compressed sparse row) del grafo del callejero.
+
+Los vértices son enteros 0..n-1 y la adyacencia de salida del vértice i son las posiciones indptr[i]:indptr[i+1]
+de los arrays "indices" (vértice destino), "arista" (arista original) y de cada columna de pesos. Frente a
+Grafo, que guarda un Vertice con un diccionario de Arista por cruce, ocupa unos pocos arrays de NumPy y ofrece
+los mismos algoritmos con la misma interfaz (los vértices se siguen identificando por sus claves originales):
+son los núcleos de búsqueda de grafo.py, a los que solo cambia la forma de leer los vecinos de cada vértice.
+'''
+
+import grafo as g
+from construccion_grafo import _aristas_por_calle_
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, Iterable, List, Tuple
+
+class GrafoCSR():
+    '''
+    Grafo en formato CSR.
+
+    - vertices: clave de cada vértice (coordenadas para el callejero); indice: vértice -> entero
+    - coords: array (n x 2) con las coordenadas de cada vértice, o None
+    - origen, destino: extremos de cada arista (una fila por arista, como Grafo.aristas)
+    - codigo: código de calle de cada arista, o None
+    - pesos: columnas float64 con el peso de cada arista por perfil ('weight', 'corta', 'rapida', ...)
+    - indptr, indices, arista: adyacencia de salida (en no dirigidos, cada arista aparece en ambos sentidos)
+    '''
+
+    def __init__(self, vertices: List[object], origen: np.ndarray, destino: np.ndarray, pesos: Dict[str, np.ndarray],
+                 dirigido: bool = False, coords: np.ndarray = None, codigo: np.ndarray = None) -> None:
+        '''
+        Construye el grafo a partir de sus aristas.
+
+        -> vertices: claves de los vértices, en el orden de sus enteros
+        -> origen, destino: arrays de enteros con los extremos de cada arista
+        -> pesos: {perfil: array de pesos de cada arista}
+        -> dirigido: si el grafo es dirigido
+        -> coords: coordenadas de cada vértice (opcional)
+        -> codigo: código de calle de cada arista (opcional)
+        '''
+
+        self.vertices = list(vertices)
+        self.indice: Dict[object, int] = {v: i for i, v in enumerate(self.vertices)}
+        self.dirigido = dirigido
+        self.coords = coords
+        self.origen = np.asarray(origen, dtype=np.int32)
+        self.destino = np.asarray(destino, dtype=np.int32)
+        self.codigo = codigo
+        self.pesos = {perfil: np.asarray(peso, dtype=np.float64) for perfil, peso in pesos.items()}
+
+        self.indptr, self.indices, self.arista = self._csr_(self.origen, self.destino)
+        self._entrante = None
+        self._pesos_csr: Dict[Tuple[str, bool], np.ndarray] = {}
+
+    def _csr_(self, origen: np.ndarray, destino: np.ndarray) -> Tuple[np.ndarray]:
+        '''
+        Ordena las aristas por vértice de origen y devuelve indptr, indices y la arista de cada posición.
+        '''
+
+        ids = np.arange(len(origen), dtype=np.int32)
+        if not self.dirigido:
+            origen, destino, ids = np.concatenate((origen, destino)), np.concatenate((destino, origen)), np.concatenate((ids, ids))
+        orden = np.argsort(origen, kind='stable')
+        indptr = np.zeros(len(self.vertices)+1, dtype=np.int64)
+        np.cumsum(np.bincount(origen, minlength=len(self.vertices)), out=indptr[1:])
+
+        return indptr, destino[orden].astype(np.int32), ids[orden]
+
+    #### Construcción ####
+    @classmethod
+    def desde_grafo(cls, grafo: g.Grafo, pesos: Dict[str, Callable[[g.Arista], float]] = None) -> 'GrafoCSR':
+        '''
+        Convierte un Grafo. Además de la columna 'weight' (peso actual de cada Arista) crea una por cada perfil
+        de "pesos" o, si no se indican, por cada perfil del grafo (ver Grafo.agregar_perfil). Si las aristas tienen
+        datos con código de calle, se conserva.
+
+        -> grafo: Grafo a convertir
+        -> pesos: {perfil: función de peso de cada Arista} (opcional)
+        '''
+
+        vertices = list(grafo.vertices)
+        indice = {v: i for i, v in enumerate(vertices)}
+        aristas = list(grafo.aristas)
+        origen = np.fromiter((indice[a.origen] for a in aristas), dtype=np.int32, count=len(aristas))
+        destino = np.fromiter((indice[a.destino] for a in aristas), dtype=np.int32, count=len(aristas))
+        columnas = {'weight': np.fromiter((a.weight for a in aristas), dtype=np.float64, count=len(aristas))}
+        for perfil, peso in (pesos if pesos is not None else grafo.perfiles).items():
+            columnas[perfil] = np.fromiter((peso(a) for a in aristas), dtype=np.float64, count=len(aristas))
+
+        coords = np.array(vertices, dtype=np.int64) if vertices and all(isinstance(v, tuple) and len(v) == 2 for v in vertices) else None
+        codigo = None
+        if aristas and all(hasattr(a.data, 'codigo') for a in aristas):
+            codigo = np.array([a.data.codigo for a in aristas])
+
+        return cls(vertices, origen, destino, columnas, grafo.dirigido, coords, codigo)
+
+    @classmethod
+    def desde_csr(cls, vertices: List[object], indptr: np.ndarray, indices: np.ndarray, arista: np.ndarray, origen: np.ndarray,
+                  destino: np.ndarray, pesos: Dict[str, np.ndarray], dirigido: bool = False, coords: np.ndarray = None,
+                  codigo: np.ndarray = None, pesos_csr: Dict[Tuple[str, bool], np.ndarray] = None) -> 'GrafoCSR':
+        '''
+        Crea el grafo directamente sobre unos arrays CSR ya construidos (por ejemplo, abiertos desde memoria
+        compartida), sin copiarlos ni volver a ordenar las aristas.
+
+        -> pesos_csr: columnas de pesos ya ordenadas como la adyacencia, por (perfil, entrante) (opcional)
+        '''
+
+        grafo = cls.__new__(cls)
+        grafo.vertices = list(vertices)
+        grafo.indice = {v: i for i, v in enumerate(grafo.vertices)}
+        grafo.dirigido = dirigido
+        grafo.coords = coords
+        grafo.origen, grafo.destino = origen, destino
+        grafo.codigo = codigo
+        grafo.pesos = dict(pesos)
+        grafo.indptr, grafo.indices, grafo.arista = indptr, indices, arista
+        grafo._entrante = None
+        grafo._pesos_csr = dict(pesos_csr) if pesos_csr else {}
+
+        return grafo
+
+    @classmethod
+    def desde_cruces(cls, cruces: pd.DataFrame) -> 'GrafoCSR':
+        '''
+        Construye el grafo del callejero directamente del DataFrame de cruces, sin pasar por Grafo. Las columnas
+        de pesos son 'corta' (longitud), 'rapida' (tiempo) y 'weight' (inicialmente la longitud).
+        '''
+
+        coords, aristas = _aristas_por_calle_(cruces)
+        vertices = list(map(tuple, coords.tolist()))
+        longitud = aristas['longitud'].to_numpy()
+        columnas = {'weight': longitud.copy(), 'corta': longitud, 'rapida': aristas['tiempo'].to_numpy()}
+
+        return cls(vertices, aristas['origen'].to_numpy(), aristas['destino'].to_numpy(), columnas, False, coords, aristas['codigo'].to_numpy())
+
+    def memoria(self) -> int:
+        '''
+        Bytes ocupados por los arrays del grafo (sin contar la lista de claves ni su índice).
+        '''
+
+        arrays = [self.origen, self.destino, self.indptr, self.indices, self.arista, *self.pesos.values()]
+        if self.coords is not None: arrays.append(self.coords)
+        if self.codigo is not None: arrays.append(self.codigo)
+
+        return sum(a.nbytes for a in arrays)
+
+    #### Operaciones básicas del TAD ####
+    def es_dirigido(self) -> bool:
+        '''
+        Indica si el grafo es dirigido o no
+        '''
+
+        return self.dirigido
+
+    def _entrantes_(self) -> Tuple[np.ndarray]:
+        '''
+        Adyacencia de entrada en formato CSR (indptr, indices, arista), calculada la primera vez que se necesita.
+        En un grafo no dirigido coincide con la de salida.
+        '''
+
+        if not self.dirigido: return self.indptr, self.indices, self.arista
+        if self._entrante is None:
+            orden = np.argsort(self.destino, kind='stable')
+            indptr = np.zeros(len(self.vertices)+1, dtype=np.int64)
+            np.cumsum(np.bincount(self.destino, minlength=len(self.vertices)), out=indptr[1:])
+            self._entrante = (indptr, self.origen[orden], orden.astype(np.int32))
+
+        return self._entrante
+
+    def _pesos_ordenados_(self, perfil: str, entrante: bool = False) -> np.ndarray:
+        '''
+        Columna de pesos del perfil en el orden de la adyacencia CSR (de salida o de entrada), para leer los
+        pesos de los vecinos de un vértice como un tramo contiguo. Se calcula la primera vez que se necesita.
+        '''
+
+        clave = (perfil, entrante and self.dirigido)
+        if clave not in self._pesos_csr:
+            arista = self._entrantes_()[2] if clave[1] else self.arista
+            self._pesos_csr[clave] = self.pesos[perfil][arista]
+
+        return self._pesos_csr[clave]
+
+    def _buscar_(self, s: int, t: int) -> int or None:
+        '''
+        Posición de la arista s -> t en las columnas de pesos, o None si no existe.
+        '''
+
+        a, b = self.indptr[s], self.indptr[s+1]
+        pos = np.flatnonzero(self.indices[a:b] == t)
+
+        return int(self.arista[a+pos[-1]]) if len(pos) else None
+
+    def obtener_arista(self, s: object, t: object, perfil: str = 'weight') -> Tuple[object, float] or None:
+        '''
+        Si existe una arista de s a t, devuelve una tupla con su código de calle (o None) y su peso.
+        Si no, devuelve None.
+        '''
+
+        if s not in self.indice or t not in self.indice: return None
+        e = self._buscar_(self.indice[s], self.indice[t])
+        if e is None: return None
+
+        codigo = self.codigo[e].item() if self.codigo is not None else None
+
+        return (codigo, float(self.pesos[perfil][e]))
+
+    def lista_adyacencia(self, u: object) -> List[object] or None:
+        '''
+        Lista de vértices adyacentes a u, o None si u no es un vértice del grafo.
+        '''
+
+        i = self.indice.get(u)
+        if i is None: return None
+
+        return [self.vertices[j] for j in self.indices[self.indptr[i]:self.indptr[i+1]].tolist()]
+
+    def grado_saliente(self, v: object) -> int or None:
+        '''
+        Grado saliente de v, o None si v no es un vértice del grafo.
+        '''
+
+        i = self.indice.get(v)
+        return int(self.indptr[i+1] - self.indptr[i]) if i is not None else None
+
+    def grado_entrante(self, v: object) -> int or None:
+        '''
+        Grado entrante de v, o None si v no es un vértice del grafo (o su grado es 0, como en Grafo).
+        '''
+
+        i = self.indice.get(v)
+        if i is None: return None
+        indptr = self._entrantes_()[0]
+
+        return int(indptr[i+1] - indptr[i]) or None
+
+    def grado(self, v: object) -> int or None:
+        '''
+        Grado si el grafo no es dirigido y grado saliente si lo es.
+        '''
+
+        return self.grado_saliente(v)
+
+    #### Algoritmos ####
+    #Los algoritmos son los núcleos de grafo.py sobre los enteros de los vértices, con los vecinos de cada uno
+    #leídos como tramos contiguos de los arrays CSR
+
+    def _vecinos_con_peso_(self, perfil: str = 'weight', entrantes: bool = False) -> Callable[[int], Iterable[Tuple[int, float]]]:
+        '''
+        Función vecinos(v) para los núcleos de búsqueda de grafo.py: pares (w, peso) de las aristas de salida de v
+        (o de las de entrada, con "entrantes") con el peso del perfil.
+        '''
+
+        indptr, indices = self._entrantes_()[:2] if entrantes else (self.indptr, self.indices)
+        peso = self._pesos_ordenados_(perfil, entrantes)
+
+        def vecinos(v: int) -> Iterable[Tuple[int, float]]:
+            a, b = indptr[v], indptr[v+1]
+            return zip(indices[a:b].tolist(), peso[a:b].tolist())
+
+        return vecinos
+
+    def _padres_(self, padre: Iterable[Tuple[int, int]]) -> Dict[object, object]:
+        '''
+        Traduce los pares (vértice, padre) por enteros al diccionario por claves que devuelve Grafo.
+        '''
+
+        return {self.vertices[v]: (self.vertices[p] if p is not None else None) for v, p in padre}
+
+    def _dijkstra_(self, origen: int, destino: int = None, perfil: str = 'weight') -> Tuple[List[int], List[float]]:
+        '''
+        Dijkstra sobre los enteros de los vértices (ver grafo._busqueda_dijkstra_). Devuelve las listas de padres
+        (None si no tiene) y de distancias.
+        '''
+
+        n = len(self.vertices)
+
+        return g._busqueda_dijkstra_(self._vecinos_con_peso_(perfil), origen, [None]*n, [g.INFTY]*n, destino)
+
+    def dijkstra(self, origen: object, perfil: str = 'weight') -> Dict[object, object]:
+        '''
+        Árbol de caminos mínimos desde "origen" con el algoritmo de Dijkstra (ver Grafo.dijkstra).
+        '''
+
+        return self._padres_(enumerate(self._dijkstra_(self.indice[origen], perfil=perfil)[0]))
+
+    def dijkstra_distancias(self, origen: object, destino: object = None, perfil: str = 'weight') -> Tuple[Dict[object, object], Dict[object, float]]:
+        '''
+        Padres y distancias desde "origen" (ver Grafo.dijkstra_distancias).
+        '''
+
+        padre, d = self._dijkstra_(self.indice[origen], self.indice.get(destino), perfil)
+
+        return self._padres_(enumerate(padre)), dict(zip(self.vertices, d))
+
+    def dijkstra_min(self, origen: object, destino: object, perfil: str = 'weight') -> Dict[object, object]:
+        '''
+        Versión acotada del algoritmo de Dijkstra hasta llegar a "destino" (ver Grafo.dijkstra_min).
+        '''
+
+        return self._padres_(enumerate(self._dijkstra_(self.indice[origen], self.indice[destino], perfil)[0]))
+
+    def a_estrella(self, origen: object, destino: object, heuristica: Callable[[object, object], float], perfil: str = 'weight') -> Dict[object, object]:
+        '''
+        Búsqueda A* (ver Grafo.a_estrella). La heurística recibe las claves de los vértices.
+        Devuelve el diccionario de padres de los vértices alcanzados.
+        '''
+
+        vertices = self.vertices
+        padre = g._busqueda_a_estrella_(self._vecinos_con_peso_(perfil), self.indice[origen], self.indice[destino],
+                                        lambda w, t: heuristica(vertices[w], destino))
+
+        return self._padres_(padre.items())
+
+    def dijkstra_bidireccional(self, origen: object, destino: object, perfil: str = 'weight') -> List[object]:
+        '''
+        Camino mínimo con Dijkstra bidireccional (ver Grafo.dijkstra_bidireccional).
+        '''
+
+        camino = g._busqueda_bidireccional_(self._vecinos_con_peso_(perfil), self._vecinos_con_peso_(perfil, entrantes=True),
+                                            self.indice[origen], self.indice[destino])
+
+        return [self.vertices[v] for v in camino]
+
+    def camino_minimo(self, origen: object, destino: object, metodo: str = 'dijkstra', heuristica: Callable[[object, object], float] = None, perfil: str = 'weight') -> List[object]:
+        '''
+        Camino mínimo entre dos vértices (ver Grafo.camino_minimo).
+
+        -> metodo: 'dijkstra', 'a_estrella' o 'bidireccional'
+        -> heuristica: función heuristica(v, destino) admisible, necesaria para 'a_estrella'
+        -> perfil: columna de pesos a usar
+        '''
+
+        if metodo == 'bidireccional':
+            return self.dijkstra_bidireccional(origen, destino, perfil)
+        elif metodo == 'dijkstra':
+            d_padres = self.dijkstra_min(origen, destino, perfil)
+        elif metodo == 'a_estrella':
+            d_padres = self.a_estrella(origen, destino, heuristica, perfil)
+        else:
+            raise ValueError(f'Método de búsqueda desconocido: {metodo}')
+
+        return g._reconstruir_camino_(d_padres, origen, destino)
+
+    def prim(self, perfil: str = 'weight') -> Dict[object, object]:
+        '''
+        Árbol (o bosque) abarcador mínimo con el algoritmo de Prim (ver Grafo.prim). Devuelve, para cada vértice,
+        su padre en el árbol.
+        '''
+
+        n = len(self.vertices)
+        padre = g._arbol_prim_(range(n), self._vecinos_con_peso_(perfil), [None]*n, [g.INFTY]*n)
+
+        return self._padres_(enumerate(padre))
+
+    def kruskal(self, perfil: str = 'weight') -> List[Tuple[object, object]]:
+        '''
+        Árbol abarcador mínimo con el algoritmo de Kruskal sobre las aristas ordenadas por peso (ver Grafo.kruskal).
+        '''
+
+        orden = np.argsort(self.pesos[perfil], kind='stable')
+        aam = g._arbol_kruskal_(range(len(self.vertices)), zip(self.origen[orden].tolist(), self.destino[orden].tolist()))
+
+        return [(self.vertices[s], self.vertices[t]) for s, t in aam]
+
+if __name__ == '__main__':
+
+    import time
+    import tracemalloc
+    import random
+    from construccion_grafo import _cargar_datos_, cargar_y_unir_cruces_por_calle, HEURISTICAS
+
+    cruces, _ = _cargar_datos_()
+
+    tracemalloc.start()
+    G = cargar_y_unir_cruces_por_calle(cruces.copy())
+    memoria_grafo = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    C = GrafoCSR.desde_cruces(cruces)
+    memoria_csr = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    pares = [random.sample(C.vertices, 2) for _ in range(50)]
+    for nombre, grafo, kwargs in (('Grafo', G, {'perfil': 'corta'}), ('GrafoCSR', C, {'perfil': 'corta'})):
+        s = time.perf_counter()
+        for o, d in pares: grafo.camino_minimo(o, d, **kwargs)
+        e = time.perf_counter()
+        print(f'{nombre}: {(e-s)/len(pares)*1000:.2f} ms por consulta')
+    print(f'Memoria Grafo: {memoria_grafo/2**20:.1f} MiB | GrafoCSR: {memoria_csr/2**20:.1f} MiB (arrays: {C.memoria()/2**20:.1f} MiB)')
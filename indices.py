@@ -0,0 +1,327 @@
+'''
+Índices precalculados sobre los datasets del callejero, para que el navegador no tenga que recorrer
+los DataFrames en cada consulta.
+'''
+
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, List, Tuple
+
+def _sin_relleno_(columna: pd.Series) -> pd.Series:
+    '''
+    Quita los espacios de relleno del final de una columna de texto de ancho fijo. Se hace sobre las
+    categorías, de modo que todas las filas comparten las mismas cadenas.
+    '''
+
+    columna = columna.astype('category')
+
+    return columna.cat.rename_categories(columna.cat.categories.str.rstrip())
+
+def nombres_calles(direcciones: pd.DataFrame) -> Dict[int, str]:
+    '''
+    Tabla {codigo de via: nombre para mostrar} ('<clase> <partícula> <nombre>' en minúsculas), tomada de la
+    primera dirección de cada vía.
+    '''
+
+    primeras = direcciones.drop_duplicates('Codigo de via')
+    columnas = ['Clase de la via', 'Partícula de la vía', 'Nombre de la vía']
+    partes = [primeras[c].astype(str).str.strip().str.lower() for c in columnas]
+    nombres = partes[0] + ' ' + partes[1] + ' ' + partes[2]
+
+    return dict(zip(primeras['Codigo de via'].tolist(), nombres.tolist()))
+
+class IndiceDirecciones():
+    '''
+    Índice de las direcciones postales por (clase de vía, nombre de vía, número, letra).
+
+    - direcciones: {(clase, nombre, numero, letra): (codigo de via, (x, y))}
+    - letras: {(clase, nombre, numero): [letras existentes para ese número]} ('' si no tiene letra)
+    '''
+
+    def __init__(self, direcciones: pd.DataFrame) -> None:
+        '''
+        Construye el índice de una vez con operaciones de pandas. El número y la letra se extraen de
+        'Direccion completa para el numero' (texto tras la coma: ' <numero> <letra>'), como hacía la
+        selección de direcciones fila a fila.
+        '''
+
+        #Texto tras la primera coma: ' <numero> <letra>', o ' <numero>  <letra>' con el número más corto
+        partes = direcciones['Direccion completa para el numero'].astype(str).str.extract(r'^[^,]*,[^ ,]*(?: ([^ ,]*))?(?: ([^ ,]*))?(?: ([^ ,]*))?')
+        numero = pd.to_numeric(partes[0], errors='coerce')
+        letra = partes[1].fillna('')
+        letra = letra.where(letra != '', partes[2].fillna(''))
+
+        validas = numero.notna().to_numpy()
+        clase = _sin_relleno_(direcciones['Clase de la via'])[validas]
+        nombre = _sin_relleno_(direcciones['Nombre de la vía'])[validas]
+        numero = numero[validas].astype(np.int64)
+        letra = letra[validas]
+        codigo = direcciones['Codigo de via'][validas]
+        x = direcciones['Coordenada X (Guia Urbana) cm'][validas].astype(np.int64)
+        y = direcciones['Coordenada Y (Guia Urbana) cm'][validas].astype(np.int64)
+
+        claves = list(zip(clase.tolist(), nombre.tolist(), numero.tolist(), letra.tolist()))
+        self.direcciones: Dict[Tuple[str, str, int, str], Tuple[int, Tuple[int, int]]] = dict(zip(claves, zip(codigo.tolist(), zip(x.tolist(), y.tolist()))))
+        self.letras: Dict[Tuple[str, str, int], List[str]] = {}
+        for c, n, num, l in dict.fromkeys(claves):
+            self.letras.setdefault((c, n, num), []).append(l)
+
+    def opciones(self, clase: str, nombre: str, numero: int) -> List[str]:
+        '''
+        Letras existentes para un número de una vía (lista vacía si la dirección no existe).
+        '''
+
+        return self.letras.get((clase.strip().upper(), nombre.strip().upper(), numero), [])
+
+    def buscar(self, clase: str, nombre: str, numero: int, letra: str = None) -> List[int or Tuple]:
+        '''
+        Busca una dirección. Devuelve [codigo de via, (x, y)], o [] si no existe o si el número tiene
+        varias letras y no se ha indicado cuál.
+
+        -> clase: clase de la vía ('CALLE', 'AVENIDA', ...)
+        -> nombre: nombre de la vía, sin partícula
+        -> numero: número de la dirección
+        -> letra: letra de la dirección (opcional si el número no tiene varias)
+        '''
+
+        clase, nombre = clase.strip().upper(), nombre.strip().upper()
+        letras = self.letras.get((clase, nombre, numero), [])
+        if letra is None:
+            if len(letras) != 1: return []
+            letra = letras[0]
+        r = self.direcciones.get((clase, nombre, numero, letra.strip()))
+
+        return list(r) if r else []
+
+class IndiceCalles():
+    '''
+    Índice de los cruces de cada calle del grafo del callejero.
+
+    - cruces: {codigo de via: array (k x 2) con las coordenadas de sus cruces, ordenadas}
+    - codigos: conjunto de códigos de las calles con cruces en el grafo
+    '''
+
+    def __init__(self, coords: np.ndarray, origen: np.ndarray, destino: np.ndarray, codigo: np.ndarray) -> None:
+        '''
+        Construye el índice a partir de las columnas del grafo: coordenadas de los cruces y, por arista,
+        índices de sus cruces y código de calle.
+        '''
+
+        coords = np.asarray(coords, dtype=np.int64).reshape(-1, 2)
+        codigo = np.asarray(codigo, dtype=np.int64)
+        #Pares (calle, cruce) sin repetir, ordenados por calle y por coordenadas del cruce
+        pares = np.unique(np.column_stack((
+            np.concatenate((codigo, codigo)),
+            np.concatenate((np.asarray(origen, dtype=np.int64), np.asarray(destino, dtype=np.int64))),
+        )), axis=0)
+        calles, cruces = pares[:, 0], coords[pares[:, 1]]
+        orden = np.lexsort((cruces[:, 1], cruces[:, 0], calles))
+        calles, cruces = calles[orden], cruces[orden]
+
+        codigos, inicios = np.unique(calles, return_index=True)
+        self.cruces: Dict[int, np.ndarray] = dict(zip(codigos.tolist(), np.split(cruces, inicios[1:])))
+        self.codigos: set = set(self.cruces)
+
+    @classmethod
+    def desde_grafo(cls, grafo) -> 'IndiceCalles':
+        '''
+        Construye el índice recorriendo una vez las aristas de un Grafo cuyos datos tienen código de calle.
+        '''
+
+        indice = {v: i for i, v in enumerate(grafo.vertices)}
+        aristas = list(grafo.aristas)
+
+        return cls(
+            np.array(list(grafo.vertices), dtype=np.int64).reshape(-1, 2),
+            np.fromiter((indice[a.origen] for a in aristas), dtype=np.int64, count=len(aristas)),
+            np.fromiter((indice[a.destino] for a in aristas), dtype=np.int64, count=len(aristas)),
+            np.fromiter((a.data.codigo for a in aristas), dtype=np.int64, count=len(aristas)),
+        )
+
+    def cruces_calle(self, codigo: int) -> np.ndarray:
+        '''
+        Coordenadas de los cruces de una calle (array vacío si no tiene).
+        '''
+
+        return self.cruces.get(codigo, np.empty((0, 2), dtype=np.int64))
+
+    def mas_cercanos(self, codigo: int, coord: Tuple[int, int], k: int = 2) -> List[Tuple[int, int]]:
+        '''
+        Los k cruces de una calle más cercanos a unas coordenadas, del más al menos cercano.
+        '''
+
+        cruces = self.cruces_calle(codigo)
+        d = np.hypot(cruces[:, 0] - coord[0], cruces[:, 1] - coord[1])
+        orden = np.argsort(d, kind='stable')[:k]
+
+        return list(map(tuple, cruces[orden].tolist()))
+
+class IndiceEspacial():
+    '''
+    Índice espacial en rejilla sobre los cruces y los segmentos (aristas) del callejero.
+
+    El plano se divide en celdas cuadradas; los cruces se agrupan por celda y cada segmento se asigna a todas las
+    celdas que cubre su rectángulo envolvente. Las consultas recorren anillos de celdas alrededor del punto y paran
+    en cuanto ningún elemento fuera de los anillos visitados puede estar más cerca, por lo que solo miran unas
+    pocas celdas.
+
+    - coords: array (n x 2) con las coordenadas de los cruces
+    - vertices: cruces, en el orden de las filas de coords
+    - segmentos: array (m x 2) con los índices de los cruces de cada segmento
+    - celda: lado de las celdas de la rejilla
+    '''
+
+    def __init__(self, coords: np.ndarray, segmentos: np.ndarray = None, celda: float = None) -> None:
+        '''
+        -> coords: coordenadas de los cruces
+        -> segmentos: índices de los cruces de cada segmento (opcional)
+        -> celda: lado de las celdas (por defecto, del orden de la separación media entre cruces)
+        '''
+
+        self.coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        self.vertices: List[Tuple[int, int]] = list(map(tuple, np.asarray(coords).reshape(-1, 2).tolist()))
+        self.segmentos = np.asarray(segmentos, dtype=np.int64).reshape(-1, 2) if segmentos is not None else np.empty((0, 2), dtype=np.int64)
+
+        minimo = self.coords.min(axis=0) if len(self.coords) else np.zeros(2)
+        maximo = self.coords.max(axis=0) if len(self.coords) else np.zeros(2)
+        if celda is None:
+            #Unos dos cruces por celda de media
+            area = max(float(np.prod(maximo - minimo)), 1.0)
+            celda = max(np.sqrt(2 * area / max(len(self.coords), 1)), 1.0)
+        self.celda = float(celda)
+        self.origen = minimo
+        self.forma = (int((maximo[0] - minimo[0]) // self.celda) + 1, int((maximo[1] - minimo[1]) // self.celda) + 1)
+
+        cx, cy = self._celdas_(self.coords)
+        self._puntos_, self._inicio_puntos_ = self._agrupar_(cx * self.forma[1] + cy, np.arange(len(self.coords)))
+
+        #Cada segmento va a todas las celdas de su rectángulo envolvente
+        a, b = self.coords[self.segmentos[:, 0]], self.coords[self.segmentos[:, 1]]
+        (x0, y0), (x1, y1) = self._celdas_(np.minimum(a, b)), self._celdas_(np.maximum(a, b))
+        ancho, alto = x1 - x0 + 1, y1 - y0 + 1
+        cuantas = ancho * alto
+        ids = np.repeat(np.arange(len(self.segmentos)), cuantas)
+        k = np.arange(cuantas.sum()) - np.repeat(np.cumsum(cuantas) - cuantas, cuantas)
+        celdas = (np.repeat(x0, cuantas) + k // np.repeat(alto, cuantas)) * self.forma[1] + np.repeat(y0, cuantas) + k % np.repeat(alto, cuantas)
+        self._segmentos_, self._inicio_segmentos_ = self._agrupar_(celdas, ids)
+
+    @classmethod
+    def desde_grafo(cls, grafo, celda: float = None) -> 'IndiceEspacial':
+        '''
+        Índice sobre los vértices (coordenadas) y las aristas de un Grafo.
+        '''
+
+        indice = {v: i for i, v in enumerate(grafo.vertices)}
+        segmentos = np.array([(indice[a.origen], indice[a.destino]) for a in grafo.aristas], dtype=np.int64).reshape(-1, 2)
+
+        return cls(np.array(list(grafo.vertices), dtype=np.int64).reshape(-1, 2), segmentos, celda)
+
+    #### Rejilla ####
+    def _celdas_(self, puntos: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        Celda (columna, fila) de cada punto. Los puntos fuera de la rejilla van a la celda del borde más cercana.
+        '''
+
+        c = np.floor((np.asarray(puntos, dtype=np.float64).reshape(-1, 2) - self.origen) / self.celda).astype(np.int64)
+
+        return np.clip(c[:, 0], 0, self.forma[0] - 1), np.clip(c[:, 1], 0, self.forma[1] - 1)
+
+    def _agrupar_(self, celdas: np.ndarray, elementos: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        Ordena los elementos por celda y devuelve, al estilo CSR, los elementos y el inicio de cada celda.
+        '''
+
+        orden = np.argsort(celdas, kind='stable')
+        inicio = np.searchsorted(celdas[orden], np.arange(self.forma[0] * self.forma[1] + 1))
+
+        return elementos[orden], inicio
+
+    def _anillo_(self, cx: int, cy: int, r: int) -> List[int]:
+        '''
+        Celdas de la rejilla a distancia de Chebyshev exactamente r de la celda (cx, cy).
+        '''
+
+        if r == 0: return [cx * self.forma[1] + cy]
+        celdas = []
+        for x in range(max(cx - r, 0), min(cx + r, self.forma[0] - 1) + 1):
+            if abs(x - cx) == r:
+                ys = range(max(cy - r, 0), min(cy + r, self.forma[1] - 1) + 1)
+            else:
+                ys = [y for y in (cy - r, cy + r) if 0 <= y < self.forma[1]]
+            celdas.extend(x * self.forma[1] + y for y in ys)
+
+        return celdas
+
+    def _buscar_(self, coord: Tuple[float, float], k: int, elementos: np.ndarray, inicio: np.ndarray, distancias: Callable) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        Búsqueda por anillos de los k elementos más cercanos. Tras recorrer el anillo r, cualquier elemento no visto
+        está a más de r celdas, así que se para cuando los k mejores ya están a esa distancia o menos.
+        '''
+
+        cx, cy = (int(c[0]) for c in self._celdas_(coord))
+        vistos, d = np.empty(0, dtype=np.int64), np.empty(0)
+        radio_max = max(cx, cy, self.forma[0] - 1 - cx, self.forma[1] - 1 - cy)
+        for r in range(radio_max + 1):
+            celdas = self._anillo_(cx, cy, r)
+            nuevos = np.concatenate([elementos[inicio[c]:inicio[c + 1]] for c in celdas])
+            if len(nuevos):
+                nuevos = np.setdiff1d(nuevos, vistos)
+                vistos, d = np.concatenate((vistos, nuevos)), np.concatenate((d, distancias(nuevos)))
+            if len(d) >= k and np.partition(d, k - 1)[k - 1] <= r * self.celda: break
+
+        orden = np.argsort(d, kind='stable')[:k]
+
+        return vistos[orden], d[orden]
+
+    #### Consultas ####
+    def k_mas_cercanos(self, coord: Tuple[float, float], k: int = 1) -> List[Tuple[Tuple[int, int], float]]:
+        '''
+        Los k cruces más cercanos a unas coordenadas, del más al menos cercano, con su distancia.
+        '''
+
+        p = np.asarray(coord, dtype=np.float64)
+        distancias = lambda i: np.hypot(*(self.coords[i] - p).T)
+        indices, d = self._buscar_(coord, k, self._puntos_, self._inicio_puntos_, distancias)
+
+        return [(self.vertices[i], float(x)) for i, x in zip(indices.tolist(), d.tolist())]
+
+    def _proyectar_(self, coord: Tuple[float, float], segmentos: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        '''
+        Proyección de un punto sobre varios segmentos: parámetro t en [0, 1], punto proyectado y distancia.
+        '''
+
+        p = np.asarray(coord, dtype=np.float64)
+        a, b = self.coords[self.segmentos[segmentos, 0]], self.coords[self.segmentos[segmentos, 1]]
+        ab = b - a
+        largo = (ab ** 2).sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            t = np.clip(np.where(largo > 0, ((p - a) * ab).sum(axis=1) / largo, 0.0), 0.0, 1.0)
+        proyeccion = a + t[:, None] * ab
+
+        return t, proyeccion, np.hypot(*(proyeccion - p).T)
+
+    def segmento_mas_cercano(self, coord: Tuple[float, float]) -> Tuple[int, Tuple[float, float], float, float] or None:
+        '''
+        Segmento más cercano a unas coordenadas. Devuelve (índice del segmento, punto proyectado, parámetro t de la
+        proyección desde su primer cruce, distancia), o None si el índice no tiene segmentos.
+        '''
+
+        if not len(self.segmentos): return None
+        indices, d = self._buscar_(coord, 1, self._segmentos_, self._inicio_segmentos_, lambda s: self._proyectar_(coord, s)[2])
+        s = int(indices[0])
+        t, proyeccion, _ = self._proyectar_(coord, indices[:1])
+
+        return s, tuple(proyeccion[0].tolist()), float(t[0]), float(d[0])
+
+    def snap(self, coord: Tuple[float, float]) -> Tuple[Tuple[int, int], Tuple[int, int], Tuple[float, float], float] or None:
+        '''
+        Sitúa unas coordenadas cualesquiera sobre la red: devuelve los dos cruces del segmento más cercano, el punto
+        proyectado sobre él y la distancia, o None si no hay segmentos.
+        '''
+
+        r = self.segmento_mas_cercano(coord)
+        if r is None: return None
+        s, proyeccion, _, d = r
+        v, w = self.segmentos[s].tolist()
+
+        return self.vertices[v], self.vertices[w], proyeccion, d
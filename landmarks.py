@@ -0,0 +1,304 @@
+'''
+Enrutamiento ALT (A*, Landmarks y desigualdad triangular) para el grafo del callejero.
+
+Se eligen unos pocos vértices de referencia (landmarks) y se precalculan las distancias desde y hacia cada uno
+de ellos. Para cualquier par (v, t) y landmark L, la desigualdad triangular da las cotas inferiores
+d(L,t) - d(L,v) y d(v,L) - d(t,L) de d(v,t), que se usan como heurística admisible en A*.
+'''
+
+import grafo as g
+import heapq
+import os
+import numpy as np
+from snapshot import hash_ficheros, huella_pesos
+from typing import Callable, Dict, Iterable, List, Tuple
+
+VERSION = 2
+
+class Landmarks():
+    '''
+    Tablas de distancias a landmarks, una por perfil de pesos.
+
+    - vertices: vértices del grafo, en el orden de las filas de las tablas
+    - indice: fila de cada vértice
+    - elegidos: índices de los landmarks de cada perfil
+    - desde / hacia: matrices (n_vertices x n_landmarks) con d(L, v) y d(v, L) de cada perfil (inf si no hay camino)
+    - huellas: hash de los ficheros de origen y de los pesos de cada perfil (ver snapshot.huella_pesos) con los
+      que se calcularon sus tablas, para reutilizar las guardadas en disco solo con el mismo grafo y pesos
+    '''
+
+    def __init__(self, grafo: g.Grafo, pesos: Dict[str, Callable[[g.Arista], float]], n: int = 16) -> None:
+        '''
+        Elige los landmarks y precalcula las tablas.
+
+        -> grafo: Grafo sobre el que se construyen
+        -> pesos: función de peso de cada perfil ('corta', 'rapida', ...)
+        -> n: número de landmarks por perfil
+        '''
+
+        self.vertices: List[object] = list(grafo.vertices)
+        self.indice: Dict[object, int] = {v: i for i, v in enumerate(self.vertices)}
+        self.dirigido = grafo.dirigido
+        self.elegidos: Dict[str, np.ndarray] = {}
+        self.desde: Dict[str, np.ndarray] = {}
+        self.hacia: Dict[str, np.ndarray] = {}
+        self.huellas: Dict[str, str] = {}
+
+        for perfil, peso in pesos.items():
+            salida, entrada = self._adyacencias_(grafo, peso)
+            self.elegidos[perfil], self.desde[perfil], self.hacia[perfil] = self._elegir_(salida, entrada, n)
+
+    #### Preprocesado ####
+    def _adyacencias_(self, grafo: g.Grafo, peso: Callable[[g.Arista], float]) -> Tuple[List[List[Tuple[int, float]]]]:
+        '''
+        Listas de adyacencia de salida y de entrada por índice de vértice, con el peso del perfil.
+        '''
+
+        salida = [[] for _ in self.vertices]
+        entrada = [[] for _ in self.vertices] if self.dirigido else salida
+        for v, v_obj in grafo.vertices.items():
+            i = self.indice[v]
+            for w, a in v_obj.adyacencia.items():
+                salida[i].append((self.indice[w], peso(a)))
+                if self.dirigido: entrada[self.indice[w]].append((i, peso(a)))
+
+        return salida, entrada
+
+    @staticmethod
+    def _dijkstra_(adyacencia: List[List[Tuple[int, float]]], origen: int) -> np.ndarray:
+        '''
+        Distancias desde "origen" a todos los vértices (inf si no son alcanzables).
+        '''
+
+        d = np.full(len(adyacencia), np.inf)
+        d[origen] = 0
+        q = [(0.0, origen)]
+
+        while q:
+            d_v, v = heapq.heappop(q)
+            if d_v > d[v]: continue
+            for w, peso in adyacencia[v]:
+                d_w = d_v + peso
+                if d_w < d[w]:
+                    d[w] = d_w
+                    heapq.heappush(q, (d_w, w))
+
+        return d
+
+    def _elegir_(self, salida: List, entrada: List, n: int) -> Tuple[np.ndarray]:
+        '''
+        Selección por punto más lejano: cada nuevo landmark es el vértice cuya distancia al landmark más
+        cercano ya elegido es máxima. Los vértices inalcanzables se ignoran, salvo que no quede ninguno
+        alcanzable, en cuyo caso se salta a otra componente.
+        '''
+
+        elegidos, desde, hacia = [], [], []
+        #Se parte del vértice más lejano a uno cualquiera, para no empezar en el centro del grafo
+        minimo = self._dijkstra_(salida, 0) if self.vertices else None
+        for _ in range(min(n, len(self.vertices))):
+            alcanzables = np.isfinite(minimo)
+            lejania = np.where(alcanzables, minimo, -1.0)
+            if lejania.max() > 0:
+                l = int(np.argmax(lejania))
+            elif not alcanzables.all():
+                #Todo lo alcanzable ya es landmark: se salta a otra componente
+                l = int(np.argmax(~alcanzables))
+            else:
+                break
+            elegidos.append(l)
+            desde.append(self._dijkstra_(salida, l))
+            hacia.append(self._dijkstra_(entrada, l) if self.dirigido else desde[-1])
+            minimo = desde[-1] if len(elegidos) == 1 else np.fmin(minimo, desde[-1])
+
+        forma = (len(self.vertices), 0)
+        return (
+            np.array(elegidos, dtype=np.int64),
+            np.column_stack(desde) if desde else np.empty(forma),
+            np.column_stack(hacia) if hacia else np.empty(forma),
+        )
+
+    #### Consultas ####
+    def cota(self, perfil: str, v: object, t: object) -> float:
+        '''
+        Cota inferior de la distancia de v a t según el perfil (0 si alguno no está en las tablas).
+        '''
+
+        i, j = self.indice.get(v), self.indice.get(t)
+        if i is None or j is None: return 0.0
+        desde, hacia = self.desde[perfil], self.hacia[perfil]
+        with np.errstate(invalid='ignore'):
+            cotas = np.concatenate((desde[j] - desde[i], hacia[i] - hacia[j]))
+
+        #inf - inf (landmark que no alcanza a ninguno de los dos) da nan y np.fmax lo ignora
+        return float(np.fmax.reduce(cotas, initial=0.0))
+
+    def heuristica(self, perfil: str, destinos: Dict[object, float]) -> Callable[[object, object], float]:
+        '''
+        Heurística admisible para Grafo.a_estrella hacia un destino. Las cotas de todos los vértices se calculan
+        de una vez con NumPy al crear la heurística, de modo que durante la búsqueda cada evaluación es un acceso
+        a una lista. Si el destino no está en las tablas (por ejemplo, una dirección añadida al grafo), se pasan
+        sus vértices vecinos con el coste de llegar desde ellos, y la cota es el mínimo entre vecinos de
+        cota(v, vecino) + coste.
+
+        -> perfil: perfil de pesos de la búsqueda
+        -> destinos: {vértice: coste} con el destino (coste 0) o sus vecinos
+        '''
+
+        filas = [(self.indice[t], c) for t, c in destinos.items() if t in self.indice]
+        if len(filas) < len(destinos) or not filas: return lambda v, destino: 0.0
+
+        desde, hacia = self.desde[perfil], self.hacia[perfil]
+        cotas = np.full(len(self.vertices), np.inf)
+        with np.errstate(invalid='ignore'):
+            for j, coste in filas:
+                cota_j = np.fmax(np.fmax.reduce(desde[j] - desde, axis=1, initial=0.0), np.fmax.reduce(hacia - hacia[j], axis=1, initial=0.0))
+                cotas = np.fmin(cotas, cota_j + coste)
+        cotas = cotas.tolist()
+
+        def h(v: object, destino: object) -> float:
+            i = self.indice.get(v)
+            return cotas[i] if i is not None else 0.0
+
+        return h
+
+    #### Actualización ####
+    def copiar_perfil(self, perfil: str, base: str) -> None:
+        '''
+        Crea las tablas de un perfil copiando las de otro con los mismos pesos (por ejemplo, un perfil de tráfico
+        que parte de los tiempos de 'rapida'), sin volver a calcularlas.
+        '''
+
+        self.elegidos[perfil] = self.elegidos[base].copy()
+        self.desde[perfil] = self.desde[base].copy()
+        self.hacia[perfil] = self.hacia[base].copy() if self.dirigido else self.desde[perfil]
+        self.huellas.pop(perfil, None)
+
+    def actualizar(self, grafo: g.Grafo, perfil: str, cambios: List[Tuple[object, object, float, float]]) -> int:
+        '''
+        Corrige las tablas de un perfil tras un cambio de pesos (ver Grafo.actualizar_pesos), sin recalcularlas.
+        Las cotas siguen siendo admisibles mientras cada tabla cumpla la desigualdad triangular con los pesos
+        actuales (d(L,w) <= d(L,v) + peso(v,w) para cada arista, y lo análogo para d(v,L)), no hace falta que
+        sean distancias exactas. Por eso las subidas de peso no requieren nada (las cotas solo se vuelven algo
+        menos ajustadas) y en las bajadas basta con propagar, como en Dijkstra, las distancias que mejoran a
+        partir de las aristas cuyo peso ha bajado.
+
+        -> grafo: Grafo con los pesos ya cambiados
+        -> perfil: perfil cambiado
+        -> cambios: tuplas (s, t, peso anterior, peso nuevo)
+        Devuelve el número de entradas de las tablas corregidas.
+        '''
+
+        if perfil not in self.desde: return 0
+        bajadas = [(self.indice[s], self.indice[t], nuevo) for s, t, anterior, nuevo in cambios if nuevo < anterior and s in self.indice and t in self.indice]
+        if not bajadas: return 0
+
+        #En un grafo no dirigido la arista baja en los dos sentidos
+        if not self.dirigido: bajadas += [(j, i, peso) for i, j, peso in bajadas]
+        salida = lambda i: ((self.indice[w], a.pesos[perfil]) for w, a in grafo.vertices[self.vertices[i]].adyacencia.items())
+        entrantes = grafo._adyacencia_entrante_()
+        entrada = lambda i: ((self.indice[w], a.pesos[perfil]) for w, a in entrantes[self.vertices[i]].items())
+
+        #Las tablas corregidas ya no son las distancias exactas de ningún perfil guardado
+        self.huellas.pop(perfil, None)
+        invertidas = [(j, i, peso) for i, j, peso in bajadas]
+        desde, hacia = self.desde[perfil], self.hacia[perfil]
+        corregidas = 0
+        for l in range(desde.shape[1]):
+            corregidas += self._propagar_(desde[:, l], bajadas, salida)
+            #En un grafo no dirigido "hacia" puede ser la misma tabla que "desde" (al cargarla) o una copia
+            if hacia is not desde: corregidas += self._propagar_(hacia[:, l], invertidas, entrada)
+
+        return corregidas
+
+    @staticmethod
+    def _propagar_(d: np.ndarray, bajadas: List[Tuple[int, int, float]], vecinos: Callable[[int], Iterable[Tuple[int, float]]]) -> int:
+        '''
+        Restablece d[j] <= d[i] + peso(i, j) en una columna de una tabla tras bajar los pesos de las aristas (i, j)
+        de "bajadas", propagando las mejoras por las aristas de "vecinos". Devuelve cuántas entradas cambian.
+        '''
+
+        q = []
+        for i, j, peso in bajadas:
+            if d[i] + peso < d[j]:
+                d[j] = d[i] + peso
+                q.append((d[j], j))
+        heapq.heapify(q)
+
+        corregidas = set()
+        while q:
+            d_v, v = heapq.heappop(q)
+            if d_v > d[v]: continue
+            corregidas.add(v)
+            for w, peso in vecinos(v):
+                d_w = d_v + peso
+                if d_w < d[w]:
+                    d[w] = d_w
+                    heapq.heappush(q, (d_w, w))
+
+        return len(corregidas)
+
+    #### Persistencia ####
+    def guardar(self, ruta: str) -> None:
+        '''
+        Guarda las tablas en un fichero .npz.
+        '''
+
+        datos = {'version': np.array(VERSION), 'dirigido': np.array(self.dirigido), 'vertices': np.array(self.vertices)}
+        for perfil in self.desde:
+            datos[f'elegidos_{perfil}'] = self.elegidos[perfil]
+            datos[f'desde_{perfil}'] = self.desde[perfil]
+            datos[f'huella_{perfil}'] = np.array(self.huellas.get(perfil, ''))
+            if self.dirigido: datos[f'hacia_{perfil}'] = self.hacia[perfil]
+        np.savez(ruta, **datos)
+
+    @classmethod
+    def cargar(cls, ruta: str) -> 'Landmarks':
+        '''
+        Carga unas tablas guardadas con guardar. Lanza ValueError si fueron guardadas con otra versión del formato.
+        '''
+
+        with np.load(ruta) as datos:
+            if int(datos['version']) != VERSION:
+                raise ValueError(f'Versión de landmarks incompatible: {int(datos["version"])}')
+            landmarks = cls.__new__(cls)
+            landmarks.dirigido = bool(datos['dirigido'])
+            landmarks.vertices = [tuple(v) if isinstance(v, list) else v for v in datos['vertices'].tolist()]
+            landmarks.indice = {v: i for i, v in enumerate(landmarks.vertices)}
+            landmarks.elegidos, landmarks.desde, landmarks.hacia, landmarks.huellas = {}, {}, {}, {}
+            for clave in datos.files:
+                if clave.startswith('desde_'):
+                    perfil = clave[len('desde_'):]
+                    landmarks.elegidos[perfil] = datos[f'elegidos_{perfil}']
+                    landmarks.desde[perfil] = datos[clave]
+                    landmarks.hacia[perfil] = datos[f'hacia_{perfil}'] if landmarks.dirigido else landmarks.desde[perfil]
+                    landmarks.huellas[perfil] = str(datos[f'huella_{perfil}'])
+
+        return landmarks
+
+def cargar_o_construir_landmarks(grafo: g.Grafo, pesos: Dict[str, Callable[[g.Arista], float]], n: int = 16, ruta: str = 'landmarks.npz', fuentes: List[str] = None) -> Landmarks:
+    '''
+    Carga las tablas de landmarks de disco si existen y se calcularon a partir de los mismos ficheros de origen,
+    con los mismos perfiles y pesos y el mismo número de landmarks; si no, las construye y las guarda.
+
+    -> grafo: Grafo del callejero
+    -> pesos: función de peso de cada perfil ('corta', 'rapida', ...)
+    -> n: número de landmarks por perfil
+    -> ruta: fichero donde se guardan las tablas
+    -> fuentes: ficheros de los que se ha construido el grafo (ver snapshot.hash_ficheros)
+    '''
+
+    hash_fuentes = hash_ficheros(fuentes) if fuentes else ''
+    huellas = {perfil: huella_pesos(grafo, peso, hash_fuentes) for perfil, peso in pesos.items()}
+
+    landmarks = None
+    if os.path.exists(ruta):
+        try:
+            landmarks = Landmarks.cargar(ruta)
+        except (ValueError, OSError, KeyError):
+            landmarks = None
+    if landmarks is None or landmarks.huellas != huellas or any(len(e) != min(n, len(grafo.vertices)) for e in landmarks.elegidos.values()):
+        landmarks = Landmarks(grafo, pesos, n)
+        landmarks.huellas = huellas
+        landmarks.guardar(ruta)
+
+    return landmarks
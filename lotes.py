@@ -0,0 +1,178 @@
+'''
+Cálculo de rutas en lote con varios procesos.
+
+Los algoritmos de grafo.py son Python puro y el GIL impide repartir las consultas entre hilos. Aquí el grafo, en
+formato CSR (ver grafo_csr.py), se publica una sola vez como arrays de solo lectura en memoria compartida
+(multiprocessing.shared_memory). Cada proceso del pool los abre sin copiarlos al arrancar, de modo que las
+tareas solo llevan los pares origen-destino y nunca el grafo, y los resultados se devuelven en el orden de
+los pares a medida que se calculan.
+'''
+
+from construccion_grafo import HEURISTICAS
+from grafo_csr import GrafoCSR
+import numpy as np
+import os
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool, shared_memory
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+class GrafoCompartido():
+    '''
+    Arrays de un GrafoCSR publicados en memoria compartida. Se usa como gestor de contexto: al salir se liberan
+    los bloques de memoria.
+
+    - descripcion: {nombre del array: (nombre del bloque, dtype, forma)}, lo que necesita un proceso para abrirlo
+    - vertices: claves de los vértices si no son las coordenadas (si lo son, cada proceso las reconstruye)
+    - dirigido: si el grafo es dirigido
+    '''
+
+    def __init__(self, grafo: GrafoCSR) -> None:
+        '''
+        Copia los arrays del grafo en bloques de memoria compartida.
+        '''
+
+        arrays = {
+            'indptr': grafo.indptr,
+            'indices': grafo.indices,
+            'arista': grafo.arista,
+            'origen': grafo.origen,
+            'destino': grafo.destino,
+        }
+        if grafo.coords is not None: arrays['coords'] = np.asarray(grafo.coords)
+        if grafo.codigo is not None: arrays['codigo'] = np.asarray(grafo.codigo)
+        for perfil, peso in grafo.pesos.items():
+            arrays[f'peso_{perfil}'] = peso
+            #Columna ya ordenada como la adyacencia CSR, para que los procesos no tengan que calcularla
+            arrays[f'csr_{perfil}'] = grafo._pesos_ordenados_(perfil)
+
+        self.dirigido = grafo.dirigido
+        self.vertices = None if 'coords' in arrays else grafo.vertices
+        self.descripcion: Dict[str, Tuple[str, str, Tuple[int]]] = {}
+        self._bloques: List[shared_memory.SharedMemory] = []
+        for nombre, array in arrays.items():
+            bloque = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=bloque.buf)[...] = array
+            self._bloques.append(bloque)
+            self.descripcion[nombre] = (bloque.name, array.dtype.str, array.shape)
+
+    def cerrar(self) -> None:
+        '''
+        Libera los bloques de memoria compartida.
+        '''
+
+        for bloque in self._bloques:
+            bloque.close()
+            bloque.unlink()
+        self._bloques = []
+
+    def __enter__(self) -> 'GrafoCompartido':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.cerrar()
+
+def abrir_grafo(descripcion: Dict[str, Tuple[str, str, Tuple[int]]], vertices: List[object] = None, dirigido: bool = False) -> Tuple[GrafoCSR, List[shared_memory.SharedMemory]]:
+    '''
+    Abre un grafo publicado con GrafoCompartido sin copiar sus arrays. Devuelve el GrafoCSR y los bloques abiertos,
+    que deben seguir referenciados mientras se use el grafo.
+    '''
+
+    bloques, arrays = [], {}
+    for nombre, (bloque, dtype, forma) in descripcion.items():
+        b = shared_memory.SharedMemory(name=bloque)
+        bloques.append(b)
+        arrays[nombre] = np.ndarray(forma, dtype=np.dtype(dtype), buffer=b.buf)
+        arrays[nombre].flags.writeable = False
+
+    coords = arrays.get('coords')
+    if vertices is None: vertices = list(map(tuple, coords.tolist()))
+    pesos = {nombre[len('peso_'):]: a for nombre, a in arrays.items() if nombre.startswith('peso_')}
+    ordenados = {(nombre[len('csr_'):], False): a for nombre, a in arrays.items() if nombre.startswith('csr_')}
+
+    grafo = GrafoCSR.desde_csr(vertices, arrays['indptr'], arrays['indices'], arrays['arista'], arrays['origen'], arrays['destino'],
+                               pesos, dirigido, coords, arrays.get('codigo'), ordenados)
+
+    return grafo, bloques
+
+#Estado de cada proceso del pool (se inicializa una vez por proceso en _iniciar_proceso_)
+_GRAFO: GrafoCSR = None
+_BLOQUES: List[shared_memory.SharedMemory] = []
+
+def _iniciar_proceso_(descripcion: Dict, vertices: List[object], dirigido: bool) -> None:
+    global _GRAFO, _BLOQUES
+    _GRAFO, _BLOQUES = abrir_grafo(descripcion, vertices, dirigido)
+
+def _resolver_(tarea: Tuple[List[Tuple[object, object]], str, str]) -> List[List[object]]:
+    '''
+    Calcula las rutas de un grupo de pares en un proceso del pool.
+    '''
+
+    pares, perfil, metodo = tarea
+    heuristica = HEURISTICAS.get(perfil, lambda v, t: 0) if metodo == 'a_estrella' else None
+
+    return [_GRAFO.camino_minimo(o, t, metodo, heuristica, perfil) for o, t in pares]
+
+def _tareas_(pares: Iterable[Tuple[object, object]], perfil: str, metodo: str, tam_tarea: int) -> Iterator[Tuple[List, str, str]]:
+    '''
+    Agrupa los pares en tareas de tam_tarea pares.
+    '''
+
+    pares = iter(pares)
+    while True:
+        grupo = list(islice(pares, tam_tarea))
+        if not grupo: return
+        yield grupo, perfil, metodo
+
+def rutas_en_lote(grafo: GrafoCSR or GrafoCompartido, pares: Iterable[Tuple[object, object]], perfil: str = 'weight',
+                  metodo: str = 'dijkstra', procesos: int = None, tam_tarea: int = 64, ventana: int = None) -> Iterator[List[object]]:
+    '''
+    Calcula el camino mínimo de cada par (origen, destino) repartiendo los pares entre un pool de procesos.
+    Devuelve un iterador con los caminos en el mismo orden que los pares, que se van entregando según terminan
+    las tareas. Como mucho hay "ventana" tareas enviadas y sin entregar: los pares se leen solo a medida que se
+    entregan los caminos, de modo que pueden venir de un generador largo sin que se acumulen en memoria (Pool.imap,
+    en cambio, lee el iterador entero en cuanto puede).
+
+    -> grafo: GrafoCSR (se publica en memoria compartida mientras dura el lote) o un GrafoCompartido ya publicado
+    -> pares: pares (origen, destino) de claves de vértices
+    -> perfil: columna de pesos
+    -> metodo: 'dijkstra', 'bidireccional' o 'a_estrella' (con la heurística de construccion_grafo.HEURISTICAS del perfil,
+    o nula si no la tiene)
+    -> procesos: número de procesos (por defecto, uno por núcleo)
+    -> tam_tarea: pares por tarea; tareas más grandes reducen la comunicación entre procesos
+    -> ventana: máximo de tareas en curso (por defecto, cuatro por proceso, para que ningún proceso quede parado)
+    '''
+
+    ventana = ventana if ventana else 4 * (procesos or os.cpu_count() or 1)
+
+    compartido = grafo if isinstance(grafo, GrafoCompartido) else GrafoCompartido(grafo)
+    try:
+        with Pool(procesos, initializer=_iniciar_proceso_, initargs=(compartido.descripcion, compartido.vertices, compartido.dirigido)) as pool:
+            en_curso = deque()
+            for tarea in _tareas_(pares, perfil, metodo, tam_tarea):
+                en_curso.append(pool.apply_async(_resolver_, (tarea,)))
+                if len(en_curso) >= ventana: yield from en_curso.popleft().get()
+            while en_curso: yield from en_curso.popleft().get()
+    finally:
+        if compartido is not grafo: compartido.cerrar()
+
+if __name__ == '__main__':
+
+    import random
+    import time
+    from construccion_grafo import _cargar_cruces_
+
+    C = GrafoCSR.desde_cruces(_cargar_cruces_())
+    pares = [tuple(random.sample(C.vertices, 2)) for _ in range(400)]
+
+    s = time.perf_counter()
+    secuencial = [C.camino_minimo(o, t, 'a_estrella', HEURISTICAS['rapida'], 'rapida') for o, t in pares]
+    e = time.perf_counter()
+    print(f'Secuencial: {(e-s):.2f} s')
+
+    with GrafoCompartido(C) as compartido:
+        for procesos in sorted({1, 2, os.cpu_count() or 1}):
+            s = time.perf_counter()
+            caminos = list(rutas_en_lote(compartido, pares, 'rapida', 'a_estrella', procesos))
+            e = time.perf_counter()
+            print(f'{procesos} procesos: {(e-s):.2f} s (iguales: {caminos == secuencial})')
@@ -0,0 +1,154 @@
+'''
+Mapa del callejero.
+
+La red de calles no cambia de una ruta a otra, así que se prepara una sola vez: sus aristas se guardan como un
+array de segmentos para una LineCollection de matplotlib (una sola colección en lugar de un dibujo por arista)
+y, para las imágenes, se rasteriza una vez por tamaño de imagen. Cada ruta solo dibuja su polilínea encima.
+
+Las imágenes se generan con matplotlib.figure.Figure, sin pyplot, de modo que no necesitan pantalla y pueden
+generarse desde varios hilos (por ejemplo, en el servidor de rutas).
+'''
+
+import grafo as g
+import io
+import threading
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.axes import Axes
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+from typing import BinaryIO, Dict, List, Tuple
+
+COLOR_CALLES = 'grey'
+COLOR_RUTA = 'red'
+COLOR_INICIO = 'green'
+COLOR_FINAL = 'blue'
+
+#Margen mínimo alrededor de la red (en las unidades de las coordenadas, cm) y máxima relación entre el lado
+#mayor y el menor del mapa, para que una red casi lineal no dé imágenes de tamaño desmesurado
+MARGEN_MINIMO = 1000
+PROPORCION_MAXIMA = 4
+
+class MapaBase():
+    '''
+    Capa fija del mapa: la red de calles de un grafo cuyos vértices son coordenadas.
+
+    - segmentos: array (n_aristas x 2 x 2) con las coordenadas de los extremos de cada arista
+    - extension: (xmin, xmax, ymin, ymax) del mapa
+    - version: versión de la estructura del grafo (ver Grafo.version_estructura), para detectar que ha cambiado
+    '''
+
+    def __init__(self, grafo: g.Grafo, margen: float = 0.02) -> None:
+        '''
+        -> grafo: Grafo del callejero
+        -> margen: margen alrededor de la red, como fracción de su lado mayor (al menos MARGEN_MINIMO)
+        '''
+
+        self.version = grafo.version_estructura()
+        self.segmentos = np.array([(a.origen, a.destino) for a in grafo.aristas], dtype=np.float64).reshape(-1, 2, 2)
+
+        coords = np.array(list(grafo.vertices), dtype=np.float64).reshape(-1, 2)
+        minimo, maximo = (coords.min(axis=0), coords.max(axis=0)) if len(coords) else (np.zeros(2), np.zeros(2))
+        borde = max((maximo - minimo).max() * margen, MARGEN_MINIMO)
+        minimo, maximo = minimo - borde, maximo + borde
+        #El lado menor se amplía, centrado, hasta que la proporción no supere PROPORCION_MAXIMA
+        lado = maximo - minimo
+        ampliacion = np.maximum(lado.max() / PROPORCION_MAXIMA - lado, 0) / 2
+        minimo, maximo = minimo - ampliacion, maximo + ampliacion
+        self.extension = (minimo[0], maximo[0], minimo[1], maximo[1])
+
+        #Imagen de la red por (tamaño, dpi)
+        self._fondos: Dict[Tuple[float, int], np.ndarray] = {}
+        self._cerrojo = threading.Lock()
+
+    def _ejes_(self, figura: Figure) -> Axes:
+        '''
+        Ejes que ocupan toda la figura, con la extensión del mapa.
+        '''
+
+        ejes = figura.add_axes((0, 0, 1, 1))
+        ejes.set_xlim(self.extension[0], self.extension[1])
+        ejes.set_ylim(self.extension[2], self.extension[3])
+        ejes.set_axis_off()
+
+        return ejes
+
+    def _tamano_(self, ancho: float) -> Tuple[float, float]:
+        '''
+        Tamaño de la figura (en pulgadas) con el ancho dado y la proporción del mapa.
+        '''
+
+        x0, x1, y0, y1 = self.extension
+
+        return ancho, ancho * (y1 - y0) / (x1 - x0)
+
+    def _calles_(self) -> LineCollection:
+        return LineCollection(self.segmentos, colors=COLOR_CALLES, linewidths=0.5)
+
+    def fondo(self, ancho: float = 8, dpi: int = 100) -> np.ndarray:
+        '''
+        Imagen RGBA de la red de calles con el tamaño dado. Se dibuja la primera vez y se reutiliza después.
+        '''
+
+        clave = (ancho, dpi)
+        with self._cerrojo:
+            if clave not in self._fondos:
+                figura = Figure(figsize=self._tamano_(ancho), dpi=dpi)
+                lienzo = FigureCanvasAgg(figura)
+                self._ejes_(figura).add_collection(self._calles_())
+                lienzo.draw()
+                self._fondos[clave] = np.asarray(lienzo.buffer_rgba()).copy()
+
+            return self._fondos[clave]
+
+    @staticmethod
+    def _ruta_(ejes: Axes, camino: List[Tuple], inicio: Tuple = None, final: Tuple = None) -> None:
+        '''
+        Dibuja la polilínea de una ruta y sus extremos.
+        '''
+
+        if camino:
+            x, y = np.array(camino, dtype=np.float64).reshape(-1, 2).T
+            ejes.plot(x, y, color=COLOR_RUTA, linewidth=3, solid_capstyle='round')
+        for punto, color in ((inicio, COLOR_INICIO), (final, COLOR_FINAL)):
+            if punto is not None: ejes.plot(punto[0], punto[1], 'o', color=color, markersize=8)
+
+    def guardar(self, camino: List[Tuple], inicio: Tuple = None, final: Tuple = None, destino: str or BinaryIO = None,
+                formato: str = 'png', ancho: float = 8, dpi: int = 100, vectorial: bool = False) -> bytes or None:
+        '''
+        Imagen del mapa con una ruta, sin pantalla. La red de calles es la imagen de fondo (ver fondo), salvo con
+        vectorial, en cuyo caso se dibuja como LineCollection (para un SVG completamente vectorial).
+
+        -> camino: vértices (coordenadas) de la ruta
+        -> inicio, final: puntos de origen y destino que se marcan (opcionales)
+        -> destino: fichero (ruta o fichero binario abierto) donde se escribe; si no se indica, se devuelven los bytes
+        -> formato: 'png', 'svg' o cualquier otro formato de matplotlib
+        -> ancho, dpi: ancho de la imagen en pulgadas y resolución
+        '''
+
+        figura = Figure(figsize=self._tamano_(ancho), dpi=dpi)
+        FigureCanvasAgg(figura)
+        ejes = self._ejes_(figura)
+        if vectorial:
+            ejes.add_collection(self._calles_())
+        else:
+            ejes.imshow(self.fondo(ancho, dpi), extent=self.extension, interpolation='none', aspect='auto')
+        self._ruta_(ejes, camino, inicio, final)
+
+        salida = destino if destino is not None else io.BytesIO()
+        figura.savefig(salida, format=formato, dpi=dpi)
+
+        return salida.getvalue() if destino is None else None
+
+    def mostrar(self, camino: List[Tuple], inicio: Tuple = None, final: Tuple = None, ancho: float = 8) -> None:
+        '''
+        Muestra en una ventana el mapa con una ruta. La red de calles se dibuja como LineCollection para poder
+        ampliarla sin perder resolución.
+        '''
+
+        figura = plt.figure(figsize=self._tamano_(ancho))
+        ejes = self._ejes_(figura)
+        ejes.add_collection(self._calles_())
+        self._ruta_(ejes, camino, inicio, final)
+        plt.show()
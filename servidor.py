@@ -0,0 +1,227 @@
+'''
+Servicio HTTP de rutas sobre un Navegador ya cargado.
+
+Servidor asyncio sin dependencias externas (HTTP/1.1 básico, una petición por conexión). Todas las peticiones
+comparten el mismo Navegador, y por tanto el mismo grafo, que no se modifica durante las consultas (los
+extremos de cada ruta son vértices virtuales de la consulta). Las búsquedas, que consumen CPU, se ejecutan en
+un pool de hilos para no bloquear el bucle de eventos.
+
+    GET  /salud                 -> {"estado": "ok"}
+    GET  /estadisticas          -> aciertos y fallos de la caché de rutas
+    POST /ruta                  -> cuerpo JSON {"origen": punto, "destino": punto, "perfil": "corta" | "rapida"}
+    GET  /ruta?ox=&oy=&dx=&dy=&perfil=
+    GET  /mapa?ox=&oy=&dx=&dy=&perfil=&formato=png|svg   -> imagen del mapa con la ruta
+
+Un punto es una dirección {"clase": "CALLE", "nombre": "...", "numero": 5, "letra": "A"} (letra opcional) o
+unas coordenadas {"x": ..., "y": ...} en cm. La respuesta es el resultado de Navegador.calcular_ruta: camino,
+longitud (m), tiempo (s), coste en el perfil e instrucciones.
+
+Uso: python servidor.py [puerto]
+'''
+
+from gps import Navegador, arrancar_navegador
+import asyncio
+import json
+import sys
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+PERFIL_DEFECTO = 'rapida'
+MAX_CUERPO = 1 << 20
+
+FORMATOS_MAPA = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+ESTADOS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+class ErrorPeticion(Exception):
+    '''
+    Error de una petición, con el código de estado HTTP que se devuelve al cliente.
+    '''
+
+    def __init__(self, estado: int, mensaje: str) -> None:
+        super().__init__(mensaje)
+        self.estado = estado
+
+def _punto_(navegador: Navegador, dato: Dict) -> List:
+    '''
+    Traduce un punto de la petición a [codigo de via, (x, y)] (codigo None para coordenadas).
+    '''
+
+    if not isinstance(dato, dict): raise ErrorPeticion(400, 'Punto no válido')
+    try:
+        if 'x' in dato and 'y' in dato:
+            return [None, (int(dato['x']), int(dato['y']))]
+        if 'clase' in dato and 'nombre' in dato and 'numero' in dato:
+            letra = dato.get('letra')
+            direccion = navegador.buscar_direccion(str(dato['clase']), str(dato['nombre']), int(dato['numero']), str(letra) if letra is not None else None)
+            if not direccion: raise ErrorPeticion(404, 'Dirección inexistente')
+            return direccion
+    except (TypeError, ValueError, OverflowError):
+        raise ErrorPeticion(400, 'Punto no válido')
+
+    raise ErrorPeticion(400, 'Un punto es {"x", "y"} o {"clase", "nombre", "numero", "letra"}')
+
+def _perfil_(navegador: Navegador, perfil: object) -> str:
+    '''
+    Comprueba que el tipo de ruta de la petición es uno de los perfiles del grafo (el JSON puede traer cualquier
+    valor, no solo cadenas).
+    '''
+
+    if not isinstance(perfil, str) or perfil not in navegador.grafo.perfiles:
+        raise ErrorPeticion(400, f'Tipo de ruta desconocido: {perfil}')
+
+    return perfil
+
+async def _ruta_(navegador: Navegador, ejecutor: Executor, origen: Dict, destino: Dict, perfil: object) -> Dict:
+    '''
+    Resuelve los puntos y calcula la ruta en el pool de hilos.
+    '''
+
+    o, d = _punto_(navegador, origen), _punto_(navegador, destino)
+    perfil = _perfil_(navegador, perfil)
+
+    ruta = await asyncio.get_running_loop().run_in_executor(ejecutor, navegador.calcular_ruta, o, d, perfil)
+    if ruta is None: raise ErrorPeticion(404, 'No existe ruta entre los puntos')
+
+    #El texto de las instrucciones es el de la consola (con códigos de formato); en JSON van estructuradas
+    return {k: v for k, v in ruta.items() if k != 'texto'}
+
+def _imagen_ruta_(navegador: Navegador, o: List, d: List, perfil: str, formato: str) -> bytes or None:
+    '''
+    Calcula la ruta y dibuja el mapa (en el pool de hilos; el mapa no necesita pantalla).
+    '''
+
+    ruta = navegador.calcular_ruta(o, d, perfil)
+    if ruta is None: return None
+
+    return navegador.imagen_ruta(o[1], d[1], [tuple(v) for v in ruta['camino']], formato=formato)
+
+async def _mapa_(navegador: Navegador, ejecutor: Executor, origen: Dict, destino: Dict, perfil: str, formato: str) -> Tuple[bytes, str]:
+    '''
+    Imagen del mapa con la ruta entre dos puntos y su tipo MIME.
+    '''
+
+    if formato not in FORMATOS_MAPA: raise ErrorPeticion(400, f'Formato desconocido: {formato}')
+    o, d = _punto_(navegador, origen), _punto_(navegador, destino)
+    perfil = _perfil_(navegador, perfil)
+
+    imagen = await asyncio.get_running_loop().run_in_executor(ejecutor, _imagen_ruta_, navegador, o, d, perfil, formato)
+    if imagen is None: raise ErrorPeticion(404, 'No existe ruta entre los puntos')
+
+    return imagen, FORMATOS_MAPA[formato]
+
+async def _responder_(navegador: Navegador, ejecutor: Executor, metodo: str, objetivo: str, cuerpo: bytes) -> Dict or Tuple[bytes, str]:
+    '''
+    Atiende una petición ya leída y devuelve el cuerpo de la respuesta: un diccionario (JSON) o, para las
+    imágenes, una tupla (bytes, tipo MIME).
+    '''
+
+    url = urlsplit(objetivo)
+    if url.path == '/salud':
+        if metodo != 'GET': raise ErrorPeticion(405, 'Método no permitido')
+        return {'estado': 'ok'}
+
+    if url.path == '/estadisticas':
+        if metodo != 'GET': raise ErrorPeticion(405, 'Método no permitido')
+        return {'cache': navegador.cache.estadisticas(), 'version_grafo': navegador.grafo.version}
+
+    if url.path == '/ruta':
+        if metodo == 'POST':
+            try:
+                peticion = json.loads(cuerpo or b'{}')
+            except ValueError:
+                raise ErrorPeticion(400, 'JSON no válido')
+            if not isinstance(peticion, dict) or 'origen' not in peticion or 'destino' not in peticion:
+                raise ErrorPeticion(400, 'Faltan "origen" o "destino"')
+            return await _ruta_(navegador, ejecutor, peticion['origen'], peticion['destino'], peticion.get('perfil', PERFIL_DEFECTO))
+        if metodo == 'GET':
+            q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            if not all(k in q for k in ('ox', 'oy', 'dx', 'dy')): raise ErrorPeticion(400, 'Faltan ox, oy, dx o dy')
+            return await _ruta_(navegador, ejecutor, {'x': q['ox'], 'y': q['oy']}, {'x': q['dx'], 'y': q['dy']}, q.get('perfil', PERFIL_DEFECTO))
+        raise ErrorPeticion(405, 'Método no permitido')
+
+    if url.path == '/mapa':
+        if metodo != 'GET': raise ErrorPeticion(405, 'Método no permitido')
+        q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if not all(k in q for k in ('ox', 'oy', 'dx', 'dy')): raise ErrorPeticion(400, 'Faltan ox, oy, dx o dy')
+        return await _mapa_(navegador, ejecutor, {'x': q['ox'], 'y': q['oy']}, {'x': q['dx'], 'y': q['dy']}, q.get('perfil', PERFIL_DEFECTO), q.get('formato', 'png'))
+
+    raise ErrorPeticion(404, 'Recurso no encontrado')
+
+async def _leer_peticion_(lector: asyncio.StreamReader) -> Tuple[str, str, bytes]:
+    '''
+    Lee la línea de petición, las cabeceras y el cuerpo (según Content-Length).
+    '''
+
+    linea = (await lector.readline()).decode('latin-1').split()
+    if len(linea) != 3: raise ErrorPeticion(400, 'Petición no válida')
+    metodo, objetivo, _ = linea
+
+    cabeceras = {}
+    while True:
+        l = await lector.readline()
+        if l in (b'\r\n', b'\n', b''): break
+        nombre, _, valor = l.decode('latin-1').partition(':')
+        cabeceras[nombre.strip().lower()] = valor.strip()
+
+    try:
+        longitud = int(cabeceras.get('content-length', 0))
+    except ValueError:
+        raise ErrorPeticion(400, 'Content-Length no válido')
+    if longitud > MAX_CUERPO: raise ErrorPeticion(413, 'Cuerpo demasiado grande')
+
+    return metodo.upper(), objetivo, await lector.readexactly(longitud) if longitud else b''
+
+async def _atender_(navegador: Navegador, ejecutor: Executor, lector: asyncio.StreamReader, escritor: asyncio.StreamWriter) -> None:
+    '''
+    Atiende una conexión: lee una petición, responde (en JSON, salvo las imágenes) y cierra.
+    '''
+
+    try:
+        try:
+            estado, respuesta = 200, await _responder_(navegador, ejecutor, *await _leer_peticion_(lector))
+        except ErrorPeticion as e:
+            estado, respuesta = e.estado, {'error': str(e)}
+        except asyncio.IncompleteReadError:
+            return
+        except Exception as e:
+            estado, respuesta = 500, {'error': f'{type(e).__name__}: {e}'}
+
+        if isinstance(respuesta, tuple):
+            cuerpo, tipo = respuesta
+        else:
+            cuerpo, tipo = json.dumps(respuesta, ensure_ascii=False).encode(), 'application/json; charset=utf-8'
+        escritor.write(
+            f'HTTP/1.1 {estado} {ESTADOS[estado]}\r\n'
+            f'Content-Type: {tipo}\r\n'
+            f'Content-Length: {len(cuerpo)}\r\n'
+            f'Connection: close\r\n\r\n'.encode('latin-1') + cuerpo
+        )
+        await escritor.drain()
+    finally:
+        escritor.close()
+
+async def servir(navegador: Navegador, host: str = '127.0.0.1', puerto: int = 8080, ejecutor: Executor = None) -> asyncio.AbstractServer:
+    '''
+    Arranca el servidor (sin bloquear) y lo devuelve. Con puerto 0 se elige uno libre (ver server.sockets).
+
+    -> navegador: Navegador ya cargado, compartido por todas las peticiones
+    -> host, puerto: dirección en la que escuchar
+    -> ejecutor: pool donde se calculan las rutas (por defecto, un ThreadPoolExecutor)
+    '''
+
+    ejecutor = ejecutor if ejecutor else ThreadPoolExecutor()
+
+    return await asyncio.start_server(lambda l, e: _atender_(navegador, ejecutor, l, e), host, puerto)
+
+async def _main_(puerto: int) -> None:
+    navegador = arrancar_navegador()
+    servidor = await servir(navegador, puerto=puerto)
+    print(f'Servidor de rutas en http://127.0.0.1:{puerto}')
+    async with servidor:
+        await servidor.serve_forever()
+
+if __name__ == '__main__':
+
+    asyncio.run(_main_(int(sys.argv[1]) if len(sys.argv) > 1 else 8080))
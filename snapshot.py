@@ -0,0 +1,142 @@
+'''
+Snapshot binario del grafo del callejero.
+
+Guarda el grafo ya construido en un único fichero versionado para no tener que volver a leer los cruces (de
+cruces.csv o de su copia columnar, ver construccion_grafo.fuente_dataset) y unirlos en cada arranque. Formato:
+
+    GPSSNAP\0 | versión (uint32) | longitud de la cabecera (uint32) | cabecera JSON | arrays
+
+La cabecera guarda el hash SHA-256 de los ficheros de origen (si alguno cambia, el snapshot deja de ser válido)
+y, para cada array, su tipo, su forma y su posición en el fichero, alineada a 64 bytes para poder abrirlo con
+memoria mapeada (np.memmap) sin copiarlo.
+'''
+
+import construccion_grafo as cg
+import grafo as g
+import hashlib
+import json
+import os
+import struct
+import numpy as np
+from typing import Callable, Dict, List
+
+MAGIA = b'GPSSNAP\0'
+VERSION = 1
+ALINEACION = 64
+
+def hash_ficheros(fuentes: List[str]) -> str:
+    '''
+    Hash SHA-256 conjunto del contenido de los ficheros de origen.
+    '''
+
+    h = hashlib.sha256()
+    for ruta in fuentes:
+        with open(ruta, 'rb') as fichero:
+            for bloque in iter(lambda: fichero.read(1 << 20), b''):
+                h.update(bloque)
+
+    return h.hexdigest()
+
+def huella_pesos(G: g.Grafo, peso: Callable[[g.Arista], float], hash_fuentes: str = '') -> str:
+    '''
+    Hash SHA-256 de un perfil de pesos sobre el grafo: combina el hash de los ficheros de origen (ver
+    hash_ficheros), los extremos de cada arista y su peso. Identifica las estructuras precalculadas a partir del
+    perfil y guardadas en disco (jerarquías de contracción, landmarks), que solo se reutilizan si coincide.
+    '''
+
+    indice = {v: i for i, v in enumerate(G.vertices)}
+    aristas = list(G.aristas)
+
+    h = hashlib.sha256(hash_fuentes.encode())
+    h.update(struct.pack('<QQ', len(G.vertices), len(aristas)))
+    h.update(np.fromiter((indice[a.origen] for a in aristas), dtype=np.int64, count=len(aristas)).tobytes())
+    h.update(np.fromiter((indice[a.destino] for a in aristas), dtype=np.int64, count=len(aristas)).tobytes())
+    h.update(np.fromiter((peso(a) for a in aristas), dtype=np.float64, count=len(aristas)).tobytes())
+
+    return h.hexdigest()
+
+def arrays_del_grafo(G: g.Grafo) -> Dict[str, np.ndarray]:
+    '''
+    Columnas del grafo del callejero: coordenadas de los cruces y, por arista, índices de sus cruces,
+    código de calle, velocidad máxima, longitud y tiempo.
+    '''
+
+    indice = {v: i for i, v in enumerate(G.vertices)}
+    aristas = list(G.aristas)
+
+    return {
+        'coords': np.array(list(G.vertices), dtype=np.int64).reshape(-1, 2),
+        'origen': np.fromiter((indice[a.origen] for a in aristas), dtype=np.int32, count=len(aristas)),
+        'destino': np.fromiter((indice[a.destino] for a in aristas), dtype=np.int32, count=len(aristas)),
+        'codigo': np.fromiter((a.data.codigo for a in aristas), dtype=np.int64, count=len(aristas)),
+        'velocidad_max': np.fromiter((a.data.velocidad_max for a in aristas), dtype=np.float64, count=len(aristas)),
+        'longitud': np.fromiter((a.data.longitud for a in aristas), dtype=np.float64, count=len(aristas)),
+        'tiempo': np.fromiter((a.data.tiempo for a in aristas), dtype=np.float64, count=len(aristas)),
+    }
+
+def guardar_snapshot(G: g.Grafo, ruta: str, fuentes: List[str]) -> None:
+    '''
+    Guarda el grafo en un snapshot ligado al contenido actual de los ficheros de origen.
+
+    -> G: Grafo del callejero
+    -> ruta: fichero de destino
+    -> fuentes: ficheros de los que se ha construido el grafo
+    '''
+
+    arrays = arrays_del_grafo(G)
+    descripcion = {}
+    posicion = 0
+    for nombre, array in arrays.items():
+        descripcion[nombre] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': posicion}
+        posicion += -(-array.nbytes // ALINEACION) * ALINEACION
+    cabecera = json.dumps({'hash': hash_ficheros(fuentes), 'arrays': descripcion}).encode()
+
+    #Los datos empiezan en el primer múltiplo de ALINEACION tras la cabecera
+    inicio = -(-(len(MAGIA) + 8 + len(cabecera)) // ALINEACION) * ALINEACION
+    temporal = ruta + '.tmp'
+    with open(temporal, 'wb') as fichero:
+        fichero.write(MAGIA + struct.pack('<II', VERSION, len(cabecera)) + cabecera)
+        for nombre, array in arrays.items():
+            fichero.seek(inicio + descripcion[nombre]['offset'])
+            fichero.write(np.ascontiguousarray(array).tobytes())
+        fichero.truncate(inicio + posicion)
+    #Se sustituye de forma atómica para no dejar nunca un snapshot a medio escribir
+    os.replace(temporal, ruta)
+
+def leer_snapshot(ruta: str, fuentes: List[str] = None) -> Dict[str, np.ndarray] or None:
+    '''
+    Abre un snapshot con memoria mapeada y devuelve sus arrays (de solo lectura), o None si no existe,
+    no tiene el formato o la versión esperados o, si se indican las fuentes, su contenido ha cambiado.
+    '''
+
+    if not os.path.exists(ruta): return None
+
+    with open(ruta, 'rb') as fichero:
+        prefijo = fichero.read(len(MAGIA) + 8)
+        if len(prefijo) < len(MAGIA) + 8 or prefijo[:len(MAGIA)] != MAGIA: return None
+        version, longitud = struct.unpack('<II', prefijo[len(MAGIA):])
+        if version != VERSION: return None
+        cabecera = json.loads(fichero.read(longitud))
+
+    if fuentes is not None and cabecera['hash'] != hash_ficheros(fuentes): return None
+
+    inicio = -(-(len(MAGIA) + 8 + longitud) // ALINEACION) * ALINEACION
+    arrays = {}
+    for nombre, d in cabecera['arrays'].items():
+        forma = tuple(d['shape'])
+        if 0 in forma:
+            arrays[nombre] = np.empty(forma, dtype=np.dtype(d['dtype']))
+        else:
+            arrays[nombre] = np.memmap(ruta, dtype=np.dtype(d['dtype']), mode='r', offset=inicio + d['offset'], shape=forma)
+
+    return arrays
+
+def cargar_snapshot(ruta: str, fuentes: List[str] = None) -> g.Grafo or None:
+    '''
+    Reconstruye el Grafo del callejero desde un snapshot, o devuelve None si no es válido (ver leer_snapshot).
+    '''
+
+    arrays = leer_snapshot(ruta, fuentes)
+    if arrays is None: return None
+
+    return cg._construir_grafo_(arrays['coords'], arrays['origen'], arrays['destino'], arrays['codigo'], arrays['velocidad_max'], arrays['longitud'])
@@ -65,4 +65,22 @@ BOLD = '\033[1m'
 ALPHA = '\033[7m'
 GREEN = '\033[38;2;85;206;88m'
 END="\033[m"
-UNDERLINE = '\033[4m'
\ No newline at end of file
+UNDERLINE = '\033[4m'
+
+#Columnas de los datasets que usan la construcción del grafo y el navegador, con tipos compactos
+COLUMNAS_CRUCES = {
+    'Codigo de vía tratado': 'int32',
+    'Clase de la via tratado': 'category',
+    'Coordenada X (Guia Urbana) cm (cruce)': 'int32',
+    'Coordenada Y (Guia Urbana) cm (cruce)': 'int32',
+}
+
+COLUMNAS_DIRECCIONES = {
+    'Codigo de via': 'int32',
+    'Clase de la via': 'category',
+    'Partícula de la vía': 'category',
+    'Nombre de la vía': 'category',
+    'Direccion completa para el numero': 'object',
+    'Coordenada X (Guia Urbana) cm': 'int32',
+    'Coordenada Y (Guia Urbana) cm': 'int32',
+}
@@ -42,3 +42,25 @@ def _leyenda_direcciones_(clases: List[str]):
     print(f'{UNDERLINE}*Las partícula de vía (como "de" o "del") se omitirán en el nombre{END}\n')
     print(f'{UNDERLINE}*Dejar los campos en blanco cerrará automáticamente el navegador\n')
 
+
+def _envolvente_convexa_(puntos: List[Tuple]) -> List[Tuple]:
+    '''
+    Envolvente convexa de un conjunto de puntos del plano (cadena monótona de Andrew), en sentido antihorario
+    y sin repetir el primer punto al final
+    '''
+
+    puntos = sorted(set(map(tuple, puntos)))
+    if len(puntos) < 3: return puntos
+
+    def giro(o: Tuple, a: Tuple, b: Tuple) -> float:
+        return (a[0]-o[0])*(b[1]-o[1]) - (a[1]-o[1])*(b[0]-o[0])
+
+    inferior, superior = [], []
+    for p in puntos:
+        while len(inferior) >= 2 and giro(inferior[-2], inferior[-1], p) <= 0: inferior.pop()
+        inferior.append(p)
+    for p in reversed(puntos):
+        while len(superior) >= 2 and giro(superior[-2], superior[-1], p) <= 0: superior.pop()
+        superior.append(p)
+
+    return inferior[:-1] + superior[:-1]
@@ -13,12 +13,22 @@ usando la librería grafo.py.
 
 Después realiza vairas operaciones básicas sobre el grafo y ejecuta sobre él:
     - Dijkstra
+    - Dijkstra con empates comparado con la versión con listas en grafos aleatorios
     - Búsqueda de un camino mínimo con Dijkstra
+    - Búsqueda de un camino mínimo con A*
+    - Búsqueda de un camino mínimo con Dijkstra bidireccional
+    - Búsqueda de un camino mínimo con otro perfil de pesos
+    - Búsqueda de un camino mínimo desde un vértice virtual
+    - Matriz de distancias entre varios orígenes y destinos
+    - Vértices alcanzables con un coste máximo (isócrona)
+    - Caminos alternativos (k caminos mínimos sin ciclos)
+    - Jerarquía de contracción comparada con Dijkstra en grafos aleatorios
     - Prim
     - Kruskal
 """
 import grafo
 import random
+from contraccion import JerarquiaContraccion
 
 MIN_PESO_ARISTA=1
 MAX_PESO_ARISTA=12
@@ -52,6 +62,106 @@ print(acm)
 camino=G.camino_minimo(1,5)
 print(camino)
 
+#A* con heurística nula (equivale a Dijkstra)
+camino=G.camino_minimo(1,5,metodo='a_estrella',heuristica=lambda v,t: 0)
+print(camino)
+
+#Dijkstra bidireccional
+camino=G.camino_minimo(1,5,metodo='bidireccional')
+print(camino)
+
+#Perfil de pesos alternativo (todas las aristas con peso 1): el grafo no se modifica
+G.agregar_perfil('saltos',lambda a: 1)
+camino=G.camino_minimo(1,5,perfil='saltos')
+print(camino)
+
+#Vértice virtual 7 conectado a 2 y 3 solo durante la consulta: el grafo no se modifica
+virtuales=G.aristas_virtuales([(7,2,None,1),(7,3,None,1)])
+camino=G.camino_minimo(7,5,virtuales=virtuales)
+print(camino)
+
+#Matriz de distancias (una búsqueda por origen)
+matriz=G.matriz_distancias([1,2],[3,4,5])
+print(matriz)
+
+#Vértices alcanzables desde 1 con coste como mucho 10 y sus costes
+alcanzados,costes=G.isocrona(1,10)
+print(alcanzados,costes)
+
+#Los 3 caminos más cortos de 1 a 5, con su coste
+caminos=G.caminos_alternativos(1,5,3)
+print(caminos)
+
+#Dijkstra con pesos empatados frente a la versión original con listas (reordenada tras cada vértice): el
+#árbol de padres debe ser el mismo
+def dijkstra_listas(H,origen):
+    padre={v: None for v in H.vertices}
+    visitado={v: False for v in H.vertices}
+    d={v: grafo.INFTY for v in H.vertices}
+    d[origen]=0
+    q=[origen]
+    while q:
+        v=q.pop(0)
+        if not visitado[v]:
+            visitado[v]=True
+            for w in H.vertices[v].adyacencia:
+                if d[w]>(d[v]+H.vertices[v].adyacencia[w].weight):
+                    d[w]=d[v]+H.vertices[v].adyacencia[w].weight
+                    padre[w]=v
+                    q.append(w)
+            q.sort(key=lambda x: d[x])
+    return padre
+
+for dirigido_emp in (False,True):
+    for _ in range(300):
+        H=grafo.Grafo(dirigido_emp)
+        n=random.randint(2,25)
+        H.agregar_vertices_mult(list(range(1,n+1)))
+        for _ in range(random.randint(1,4*n)):
+            s,t=random.randint(1,n),random.randint(1,n)
+            if s!=t: H.agregar_arista(s,t,None,random.randint(0,3))
+        o=random.randint(1,n)
+        assert H.dijkstra(o)==dijkstra_listas(H,o)
+print('Dijkstra con empates: OK')
+
+#Jerarquía de contracción frente a Dijkstra en grafos aleatorios: mismo coste y, al desempaquetar los
+#atajos, un camino formado por aristas del grafo. Al eliminar una arista la jerarquía deja de ser vigente
+#y la reconstruida vuelve a coincidir con Dijkstra
+def coste(H,camino):
+    return sum(H.obtener_arista(camino[i],camino[i+1])[1] for i in range(len(camino)-1))
+
+def comprobar_jerarquia(H,jerarquia,consultas=50):
+    n=len(H.vertices)
+    for _ in range(consultas):
+        o,d=random.randint(1,n),random.randint(1,n)
+        _,distancias=H.dijkstra_distancias(o)
+        camino=jerarquia.camino_minimo(o,d)
+        assert camino[0]==o
+        if distancias[d]>=grafo.INFTY:
+            assert camino==[o]
+            continue
+        assert camino[-1]==d
+        assert all(H.obtener_arista(camino[i],camino[i+1]) for i in range(len(camino)-1))
+        assert coste(H,camino)==distancias[d]
+
+for dirigido_ch in (False,True):
+    for _ in range(5):
+        H=grafo.Grafo(dirigido_ch)
+        n=random.randint(10,40)
+        H.agregar_vertices_mult(list(range(1,n+1)))
+        for _ in range(3*n):
+            s,t=random.randint(1,n),random.randint(1,n)
+            if s!=t: H.agregar_arista(s,t,None,random.randrange(MIN_PESO_ARISTA,MAX_PESO_ARISTA))
+        jerarquia=JerarquiaContraccion(H,lambda a: a.weight)
+        assert jerarquia.vigente(H)
+        comprobar_jerarquia(H,jerarquia)
+
+        a=random.choice(list(H.aristas))
+        H.eliminar_arista(a.origen,a.destino)
+        assert not jerarquia.vigente(H)
+        comprobar_jerarquia(H,JerarquiaContraccion(H,lambda a: a.weight))
+print('Jerarquía de contracción: OK')
+
 if(not dirigido):
     #Árbol abarcador mínimo
     aam=G.kruskal()
@@ -0,0 +1,93 @@
+"""
+test_servidor.py
+
+Script para verificación básica del servidor de rutas (servidor.py).
+
+Construye un callejero mínimo (dos calles que se cruzan) con su Navegador, arranca el servidor en un puerto
+libre y comprueba las respuestas de:
+    - /salud
+    - /ruta por GET (coordenadas) y por POST (coordenadas y dirección)
+    - /mapa en PNG
+    - peticiones erróneas: tipo de ruta desconocido o que no es una cadena, JSON no válido, faltan puntos,
+      coordenadas infinitas, dirección inexistente, recurso inexistente y método no permitido
+"""
+import asyncio
+import json
+import numpy as np
+import pandas as pd
+from construccion_grafo import _construir_grafo_
+from gps import Navegador
+from indices import IndiceCalles
+from servidor import servir
+
+#Callejero: la calle 1 va de oeste a este y la 2 de sur a norte, y se cruzan en (1000, 1000)
+coords=np.array([(0,1000),(1000,1000),(2000,1000),(1000,0),(1000,2000)])
+G=_construir_grafo_(coords,[0,1,3,1],[1,2,1,4],[1,1,2,2],[1000,1000,1000,1000],[1000,1000,1000,1000])
+direcciones=pd.DataFrame({
+    'Codigo de via':[1,2],
+    'Clase de la via':['CALLE','CALLE'],
+    'Partícula de la vía':['DE','DE'],
+    'Nombre de la vía':['PRUEBA','ENSAYO'],
+    'Direccion completa para el numero':['CALLE DE PRUEBA, 1','CALLE DE ENSAYO, 2'],
+    'Coordenada X (Guia Urbana) cm':[500,1000],
+    'Coordenada Y (Guia Urbana) cm':[1000,1500],
+})
+calles=IndiceCalles.desde_grafo(G)
+navegador=Navegador(G,direcciones,calles.codigos,calles=calles)
+
+async def peticion(puerto,metodo,objetivo,cuerpo=b''):
+    #Una petición HTTP por conexión, como atiende el servidor. Devuelve el estado, el tipo y el cuerpo
+    lector,escritor=await asyncio.open_connection('127.0.0.1',puerto)
+    escritor.write(f'{metodo} {objetivo} HTTP/1.1\r\nHost: prueba\r\nContent-Length: {len(cuerpo)}\r\n\r\n'.encode('latin-1')+cuerpo)
+    await escritor.drain()
+    respuesta=await lector.read()
+    escritor.close()
+    cabecera,_,cuerpo=respuesta.partition(b'\r\n\r\n')
+    lineas=cabecera.decode('latin-1').split('\r\n')
+    tipo=[l.split(':',1)[1].strip() for l in lineas if l.lower().startswith('content-type')][0]
+    return int(lineas[0].split()[1]),tipo,cuerpo
+
+async def comprobar():
+    servidor=await servir(navegador,puerto=0)
+    puerto=servidor.sockets[0].getsockname()[1]
+    async with servidor:
+        estado,_,cuerpo=await peticion(puerto,'GET','/salud')
+        assert estado==200 and json.loads(cuerpo)=={'estado':'ok'}
+
+        #Ruta de la calle 1 a la calle 2 por el cruce
+        estado,_,cuerpo=await peticion(puerto,'GET','/ruta?ox=0&oy=1000&dx=1000&dy=2000&perfil=corta')
+        ruta=json.loads(cuerpo)
+        assert estado==200 and ruta['camino'][0]==[0,1000] and ruta['camino'][-1]==[1000,2000] and [1000,1000] in ruta['camino']
+        print('GET /ruta:',ruta['camino'],ruta['longitud'],'m')
+
+        origen={'clase':'CALLE','nombre':'PRUEBA','numero':1}
+        estado,_,cuerpo=await peticion(puerto,'POST','/ruta',json.dumps({'origen':origen,'destino':{'x':2000,'y':1000}}).encode())
+        assert estado==200 and json.loads(cuerpo)['camino'][-1]==[2000,1000]
+        print('POST /ruta:',json.loads(cuerpo)['camino'])
+
+        estado,tipo,cuerpo=await peticion(puerto,'GET','/mapa?ox=0&oy=1000&dx=1000&dy=2000&formato=png')
+        assert estado==200 and tipo=='image/png' and cuerpo.startswith(b'\x89PNG')
+
+        errores=[
+            (400,'POST','/ruta',json.dumps({'origen':{'x':0,'y':1000},'destino':{'x':2000,'y':1000},'perfil':['corta']}).encode()),
+            (400,'POST','/ruta',json.dumps({'origen':{'x':0,'y':1000},'destino':{'x':2000,'y':1000},'perfil':'volando'}).encode()),
+            (400,'GET','/ruta?ox=0&oy=1000&dx=2000&dy=1000&perfil=volando',b''),
+            (400,'POST','/ruta',b'{no es json'),
+            (400,'POST','/ruta',b'{"origen":{"x":1e400,"y":1000},"destino":{"x":2000,"y":1000}}'),
+            (400,'GET','/ruta?ox=inf&oy=1000&dx=2000&dy=1000',b''),
+            (400,'POST','/ruta',json.dumps({'origen':{'x':0,'y':1000}}).encode()),
+            (400,'GET','/ruta?ox=0&oy=1000',b''),
+            (400,'GET','/mapa?ox=0&oy=1000&dx=2000&dy=1000&formato=gif',b''),
+            (404,'POST','/ruta',json.dumps({'origen':{'clase':'CALLE','nombre':'PRUEBA','numero':99},'destino':{'x':0,'y':1000}}).encode()),
+            (404,'GET','/no-existe',b''),
+            (405,'POST','/salud',b''),
+            (405,'DELETE','/ruta',b''),
+        ]
+        for esperado,metodo,objetivo,cuerpo in errores:
+            estado,_,respuesta=await peticion(puerto,metodo,objetivo,cuerpo)
+            assert estado==esperado,(metodo,objetivo,estado,respuesta)
+            assert 'error' in json.loads(respuesta)
+        print('Errores:',[e[0] for e in errores])
+
+asyncio.run(comprobar())
+print('Servidor: OK')
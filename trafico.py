@@ -0,0 +1,144 @@
+'''
+Tráfico en tiempo real.
+
+El perfil de tráfico se superpone a los tiempos de recorrido de las aristas (Datos_de_arista.tiempo): parte de
+los tiempos a velocidad máxima, igual que 'rapida', y recibe en bloque los tiempos medidos en los tramos con
+tráfico, sin tocar los demás perfiles ni reconstruir nada. Cada bloque de tiempos:
+
+    - cambia los pesos del perfil con Grafo.actualizar_pesos
+    - corrige de forma incremental las tablas de landmarks del perfil (ver Landmarks.actualizar)
+    - aumenta la versión del grafo una vez (Grafo.publicar_pesos), de modo que las rutas del perfil guardadas
+      en la caché del navegador dejan de usarse (las de otros perfiles no)
+
+Las jerarquías de contracción no admiten cambios de pesos sin volver a construirlas, así que el perfil de
+tráfico nunca las usa: sus rutas se calculan con A* y landmarks. Ningún tramo baja de su tiempo a velocidad
+máxima, por lo que la heurística de coordenadas de 'rapida' sigue siendo admisible.
+'''
+
+from gps import Navegador
+import time
+from typing import Dict, Iterable, List, Tuple
+
+PERFIL_TRAFICO = 'trafico'
+
+class Trafico():
+    '''
+    Perfil de pesos con el tráfico en tiempo real de un navegador.
+
+    - perfil: nombre del perfil en el grafo
+    - tramos: tiempo vigente de cada arista (origen, destino) con tráfico (las demás van a velocidad máxima)
+    - lotes, actualizados, corregidas, segundos: estadísticas acumuladas de las actualizaciones (ver estadisticas)
+    '''
+
+    def __init__(self, navegador: Navegador, perfil: str = PERFIL_TRAFICO, base: str = 'rapida') -> None:
+        '''
+        Añade el perfil al grafo del navegador con los tiempos a velocidad máxima.
+
+        -> navegador: Navegador cuyo grafo recibe el tráfico
+        -> perfil: nombre del perfil de tráfico
+        -> base: perfil con los mismos pesos iniciales, del que se copian las tablas de landmarks si las hay
+        '''
+
+        self.navegador = navegador
+        self.grafo = navegador.grafo
+        self.perfil = perfil
+        self.tramos: Dict[Tuple, float] = {}
+        self.lotes = 0
+        self.actualizados = 0
+        self.corregidas = 0
+        self.segundos = 0.0
+
+        self.grafo.agregar_perfil(perfil, lambda a: a.data.tiempo)
+        navegador.jerarquias.pop(perfil, None)
+        landmarks = navegador.landmarks
+        if landmarks and base in landmarks.desde: landmarks.copiar_perfil(perfil, base)
+
+    def actualizar(self, tiempos: Iterable[Tuple[object, object, float]]) -> Dict[str, float]:
+        '''
+        Aplica un bloque de tiempos de recorrido medidos. Los tiempos por debajo del tiempo a velocidad máxima
+        del tramo se toman como este (así, un tiempo 0 devuelve el tramo a su estado sin tráfico).
+
+        -> tiempos: tuplas (s, t, segundos) de aristas del grafo; las que no existen se ignoran
+        Devuelve los tramos cambiados e ignorados, las entradas de las tablas de landmarks corregidas, el tiempo
+        empleado y los tramos por segundo.
+        '''
+
+        inicio = time.perf_counter()
+
+        cambios, ignorados = [], 0
+        for s, t, tiempo in tiempos:
+            a = self.grafo.vertices[s].adyacencia.get(t) if s in self.grafo.vertices else None
+            if not a:
+                ignorados += 1
+                continue
+            tiempo = max(tiempo, a.data.tiempo)
+            cambios.append((s, t, tiempo))
+            if tiempo > a.data.tiempo: self.tramos[(a.origen, a.destino)] = tiempo
+            else: self.tramos.pop((a.origen, a.destino), None)
+
+        #Las tablas de landmarks se corrigen antes de cambiar la versión: una ruta calculada con la versión
+        #nueva nunca usa las cotas anteriores, que con los pesos nuevos podrían no ser admisibles
+        aplicados = self.grafo.actualizar_pesos(cambios, self.perfil, publicar=False)
+        landmarks = self.navegador.landmarks
+        corregidas = landmarks.actualizar(self.grafo, self.perfil, aplicados) if landmarks else 0
+        if aplicados: self.grafo.publicar_pesos(self.perfil)
+
+        segundos = time.perf_counter() - inicio
+        self.lotes += 1
+        self.actualizados += len(aplicados)
+        self.corregidas += corregidas
+        self.segundos += segundos
+
+        return {
+            'tramos': len(aplicados),
+            'ignorados': ignorados,
+            'corregidas': corregidas,
+            'segundos': segundos,
+            'tramos_por_segundo': len(aplicados) / segundos if segundos else 0.0,
+        }
+
+    def restablecer(self, tramos: List[Tuple[object, object]] = None) -> Dict[str, float]:
+        '''
+        Devuelve a su tiempo a velocidad máxima los tramos indicados (por defecto, todos los que tienen tráfico).
+        '''
+
+        return self.actualizar([(s, t, 0) for s, t in (tramos if tramos is not None else list(self.tramos))])
+
+    def estadisticas(self) -> Dict[str, float]:
+        '''
+        Lotes aplicados, tramos actualizados, tramos con tráfico, entradas de landmarks corregidas, tiempo total y
+        tramos por segundo.
+        '''
+
+        return {
+            'lotes': self.lotes,
+            'actualizados': self.actualizados,
+            'con_trafico': len(self.tramos),
+            'corregidas': self.corregidas,
+            'segundos': self.segundos,
+            'tramos_por_segundo': self.actualizados / self.segundos if self.segundos else 0.0,
+        }
+
+if __name__ == '__main__':
+
+    import random
+    from construccion_grafo import _cargar_cruces_, _cargar_direcciones_, cargar_y_unir_cruces_por_calle, PESOS
+    from indices import IndiceCalles
+    from landmarks import Landmarks
+
+    G = cargar_y_unir_cruces_por_calle(_cargar_cruces_())
+    calles = IndiceCalles.desde_grafo(G)
+    navegador = Navegador(G, _cargar_direcciones_(), calles.codigos, landmarks=Landmarks(G, {'rapida': PESOS['rapida']}, 8), calles=calles)
+    trafico = Trafico(navegador)
+
+    aristas = [(a.origen, a.destino) for a in G.aristas]
+    for _ in range(20):
+        lote = [(s, t, G.vertices[s].adyacencia[t].data.tiempo * random.uniform(0.5, 4)) for s, t in random.sample(aristas, 300)]
+        trafico.actualizar(lote)
+    print(trafico.estadisticas())
+
+    vertices = list(G.vertices)
+    for _ in range(5):
+        o, d = random.sample(vertices, 2)
+        rapida, con_trafico = navegador.calcular_ruta([None, o], [None, d], 'rapida'), navegador.calcular_ruta([None, o], [None, d], PERFIL_TRAFICO)
+        print(f'Sin tráfico: {rapida["coste"]:.0f} s, con tráfico: {con_trafico["coste"]:.0f} s')